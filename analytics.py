@@ -0,0 +1,214 @@
+"""Spending trends and forecasts computed with NumPy.
+
+Expenses are read once per report as column arrays of daily totals per
+category (one row per day and category rather than per expense), and every
+series is derived from those arrays with vectorized bucketing:
+    
+    with ExpenseStore() as store:
+        report = store.trends(period='week')
+
+NumPy is only needed here; expense_store imports this module on first use.
+"""
+import numpy as np
+
+from expense_store import range_clause, where_sql
+
+PERIODS = ('day', 'week', 'month')
+
+# Number of months in one seasonal cycle, and how many cycles are needed
+# before the forecast switches from a straight trend to a seasonal one
+SEASON_LENGTH = 12
+SEASONAL_MIN_CYCLES = 2
+
+class ExpenseColumns:
+    """Daily spending per category as parallel NumPy arrays
+    
+    dates are datetime64[D], codes index into categories and amounts are
+    the summed rupee amounts for that date and category.
+    """
+    def __init__(self, dates, codes, categories, amounts):
+        self.dates = dates
+        self.codes = codes
+        self.categories = categories
+        self.amounts = amounts
+    
+    def __len__(self):
+        return len(self.amounts)
+
+def load_columns(conn, date_range=None, category=None):
+    """Read daily totals per category for a filter into ExpenseColumns"""
+    conditions, params = range_clause(date_range, category)
+    rows = conn.execute(f'''
+        SELECT date, category, SUM(amount)
+        FROM expenses
+        {where_sql(conditions)}
+        GROUP BY date, category
+    ''', params).fetchall()
+    
+    if not rows:
+        return ExpenseColumns(np.array([], dtype='datetime64[D]'), np.array([], dtype=np.intp),
+                              np.array([], dtype=str), np.array([], dtype=float))
+    
+    dates, names, amounts = zip(*rows)
+    categories, codes = np.unique(np.array(names), return_inverse=True)
+    # Sums are exact in paisa; the analysis works in rupees
+    return ExpenseColumns(np.array(dates, dtype='datetime64[D]'), codes, categories,
+                          np.array(amounts, dtype=np.int64) / 100)
+
+def check_period(period):
+    """Raise ValueError for an unknown period name"""
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; expected one of {', '.join(PERIODS)}")
+
+def period_starts(dates, period):
+    """Map datetime64[D] dates to the first day of their day, week or month"""
+    check_period(period)
+    if period == 'day':
+        return dates
+    if period == 'week':
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype('datetime64[D]')
+    return dates.astype('datetime64[M]').astype('datetime64[D]')
+
+def period_index(columns, period):
+    """Return (labels, index) where labels lists every period from the first
+    to the last expense, including empty ones, and index maps each row to it
+    """
+    starts = period_starts(columns.dates, period)
+    if period == 'month':
+        months = starts.astype('datetime64[M]')
+        first = months.min()
+        index = (months - first).astype(np.intp)
+        labels = first + np.arange(index.max() + 1)
+    else:
+        step = 7 if period == 'week' else 1
+        first = starts.min()
+        index = ((starts - first).astype(np.intp)) // step
+        labels = first + np.arange(index.max() + 1) * step
+    return labels, index
+
+def spend_series(columns, period='month'):
+    """Return (labels, totals) for consecutive days, weeks or months"""
+    check_period(period)
+    if not len(columns):
+        return columns.dates, np.zeros(0)
+    labels, index = period_index(columns, period)
+    return labels, np.bincount(index, weights=columns.amounts, minlength=len(labels))
+
+def category_series(columns, period='month'):
+    """Return (labels, totals) with one row of totals per category in
+    columns.categories
+    """
+    if not len(columns):
+        return spend_series(columns, period)[0], np.zeros((0, 0))
+    labels, index = period_index(columns, period)
+    cells = columns.codes * len(labels) + index
+    totals = np.bincount(cells, weights=columns.amounts,
+                         minlength=len(columns.categories) * len(labels))
+    return labels, totals.reshape(len(columns.categories), len(labels))
+
+def rolling_average(values, window=3):
+    """Trailing mean over the last window periods along the last axis
+    
+    Positions without a full window are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if window < 1 or values.shape[-1] < window:
+        return result
+    padded = np.concatenate([np.zeros(values.shape[:-1] + (1,)), values], axis=-1)
+    sums = np.cumsum(padded, axis=-1)
+    result[..., window - 1:] = (sums[..., window:] - sums[..., :-window]) / window
+    return result
+
+def period_deltas(values):
+    """Return (change, percent) from each period to the next along the last axis
+    
+    The first period, and percentages relative to an empty period, are NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    change = np.full(values.shape, np.nan)
+    percent = np.full(values.shape, np.nan)
+    if values.shape[-1] < 2:
+        return change, percent
+    change[..., 1:] = np.diff(values, axis=-1)
+    previous = values[..., :-1]
+    np.divide(change[..., 1:], previous, out=percent[..., 1:], where=previous != 0)
+    percent *= 100
+    return change, percent
+
+def forecast_next(totals, season=SEASON_LENGTH):
+    """Forecast the period after a series of monthly totals
+    
+    Returns (value, method). A least-squares trend line is used, scaled by
+    the average seasonal factor of the same month in earlier years once at
+    least SEASONAL_MIN_CYCLES years of history are available.
+    """
+    totals = np.asarray(totals, dtype=float)
+    count = len(totals)
+    if count == 0:
+        return 0.0, 'none'
+    if count < 3:
+        return float(totals.mean()), 'average'
+    
+    x = np.arange(count)
+    slope, intercept = np.polyfit(x, totals, 1)
+    trend = slope * x + intercept
+    value = slope * count + intercept
+    method = 'linear'
+    
+    if count >= season * SEASONAL_MIN_CYCLES:
+        ratios = np.divide(totals, trend, out=np.ones(count), where=trend > 0)
+        # Earlier months at the same position in the cycle as the next one
+        value *= ratios[count % season::season].mean()
+        method = 'seasonal'
+    
+    return max(float(value), 0.0), method
+
+def trend_report(conn, date_range=None, category=None, period='month', window=3):
+    """Summarize spending trends for a filter
+    
+    Returns a dict with the spend series for period and its rolling average
+    and change, month-over-month figures for each category's latest month,
+    and a forecast for the month after the last one with expenses.
+    """
+    columns = load_columns(conn, date_range, category)
+    labels, totals = spend_series(columns, period)
+    change, percent = period_deltas(totals)
+    
+    months, by_category = category_series(columns, 'month')
+    monthly = by_category.sum(axis=0)
+    category_change, category_percent = period_deltas(by_category)
+    category_average = rolling_average(by_category, window)
+    
+    categories = []
+    if len(months):
+        # Every category's figures for the overall latest month, which is zero
+        # for a category with no spending that month; one entry per category
+        for i, name in enumerate(columns.categories):
+            categories.append({
+                'category': str(name),
+                'total': float(by_category[i, -1]),
+                'average': float(category_average[i, -1]),
+                'change': float(category_change[i, -1]),
+                'percent': float(category_percent[i, -1]),
+            })
+        categories.sort(key=lambda row: row['total'], reverse=True)
+    
+    forecast, method = forecast_next(monthly)
+    next_month = months[-1] + 1 if len(months) else None
+    
+    return {
+        'period': period,
+        'labels': [str(label) for label in labels],
+        'totals': totals,
+        'average': rolling_average(totals, window),
+        'change': change,
+        'percent': percent,
+        'month': str(months[-1]) if len(months) else None,
+        'categories': categories,
+        'forecast_month': str(next_month) if next_month is not None else None,
+        'forecast': forecast,
+        'forecast_method': method,
+    }
@@ -1,62 +1,381 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import sqlite3
-import json
-import csv
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import io
+import sys
+import argparse
+import threading
+import queue
+import traceback
+import math
+from collections import Counter
 from datetime import datetime, date
 import os
 
+from expense_store import (ExpenseStore, open_backup, is_ndjson, month_range, date_range, 
+                           describe_filter, search_query, parse_amount, format_amount, parse_date, 
+                           ledger_path, list_ledgers, find_ledger, DEFAULT_LEDGER, 
+                           parse_pragmas, budget_threshold, crossed_budget_threshold, 
+                           describe_budget, DEFAULT_PRAGMAS, RECURRING_FREQUENCIES, 
+                           BUDGET_THRESHOLDS, PAGE_SIZE)
+
+IMPORT_TIME = time.perf_counter() - IMPORT_STARTED
+
+# Load the next page once fewer than this many loaded rows remain below the view
+PREFETCH_MARGIN = 50
+
+# How often the Tk thread collects results from the database worker
+POLL_INTERVAL_MS = 50
+
+# Delay that batches several data changes into one chart redraw
+CHART_UPDATE_DELAY_MS = 200
+
+# Pause in typing after which the description search runs
+SEARCH_DELAY_MS = 250
+
+# How often the performance stats window refreshes while open
+STATS_REFRESH_MS = 1000
+
+# Threads running read-only jobs (export, backup, trends) beside the writer
+READER_WORKERS = 2
+
+# Connections each database thread keeps open, e.g. for recently used ledgers
+STORES_PER_WORKER = 2
+
+BACKUP_FILETYPES = [
+    ("JSON files", "*.json"), ("Compressed JSON", "*.json.gz *.json.bz2 *.json.xz *.json.zst"),
+    ("NDJSON files", "*.ndjson *.jsonl"), 
+    ("Compressed NDJSON", "*.ndjson.gz *.ndjson.bz2 *.ndjson.xz *.ndjson.zst"),
+    ("All files", "*.*")
+]
+
+SNAPSHOT_FILETYPES = [("SQLite snapshots", "*.db *.sqlite3"), ("All files", "*.*")]
+
+INCREMENTAL_FILETYPES = [
+    ("Incremental backups", "*.ndjson *.ndjson.gz *.ndjson.bz2 *.ndjson.xz *.ndjson.zst"),
+    ("All files", "*.*")
+]
+
+class StartupTimer:
+    """Collect how long each startup phase takes for the --timing report"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = [('imports', IMPORT_TIME)]
+    
+    def record(self, phase, started):
+        """Record a phase that began at the perf_counter value started"""
+        self.phases.append((phase, time.perf_counter() - started))
+    
+    def timed(self, phase, fn):
+        """Wrap fn so that each call is recorded as phase"""
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(phase, started)
+        return wrapper
+    
+    def report(self, file=sys.stderr):
+        total = IMPORT_TIME + time.perf_counter() - self.started
+        print("Startup timing (ms):", file=file)
+        for phase, seconds in self.phases:
+            print(f"  {phase:<24}{seconds * 1000:10.1f}", file=file)
+        print(f"  {'time to first window':<24}{total * 1000:10.1f}", file=file)
+
+class JobCancelled(Exception):
+    """Raised inside a database job after the user cancels it"""
+
+class Job:
+    """A unit of work for the database worker thread"""
+    
+    def __init__(self, executor, fn, on_done, on_error, on_progress):
+        self.executor = executor
+        self.fn = fn
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+    
+    def cancel(self):
+        """Ask the job to stop at its next progress checkpoint"""
+        self.cancelled.set()
+    
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise JobCancelled()
+    
+    def report(self, count, fraction=None):
+        """Send progress to the Tk thread (called from the worker)"""
+        if self.on_progress:
+            self.executor.completions.put((self.on_progress, (count, fraction)))
+    
+    def run_steps(self, steps, fraction=None):
+        """Drive a generator of progress counts, honouring cancellation.
+        
+        Closing the generator on cancel lets it roll back its transaction.
+        """
+        count = 0
+        try:
+            for count in steps:
+                self.check_cancelled()
+                self.report(count, fraction(count) if fraction else None)
+        finally:
+            steps.close()
+        return count
+
+class DatabaseExecutor:
+    """Run database jobs on dedicated threads that own their connections.
+    
+    Jobs are functions called as fn(store, job), where store is opened on
+    the database that path named when the job was submitted. With a single
+    worker, jobs run in submission order; several workers run jobs side by
+    side, which under WAL suits read-only work. Each worker keeps its most
+    recently used connections open. Results, errors and progress are queued
+    back and delivered on the Tk thread by polling with root.after, so
+    callbacks may touch widgets freely. With stats, the time of every job
+    and callback is recorded. prepare(store), if given, runs before every
+    job, so settings changed later reach connections already open.
+    """
+    
+    def __init__(self, root, connect, path, stats=None, workers=1, name="database-worker", 
+                 preconnect=False, prepare=None):
+        self.root = root
+        self.path = path
+        self.stats = stats
+        self.prepare = prepare
+        self.requests = queue.Queue()
+        self.completions = queue.Queue()
+        self.threads = [threading.Thread(target=self.run, args=(connect, preconnect), 
+                                         name=name if workers == 1 else f"{name}-{number}", 
+                                         daemon=True)
+                        for number in range(1, workers + 1)]
+        for thread in self.threads:
+            thread.start()
+        self.poll_id = self.root.after(POLL_INTERVAL_MS, self.poll)
+    
+    def submit(self, fn, on_done=None, on_error=None, on_progress=None):
+        """Queue fn(store, job) for the current path and return its Job"""
+        job = Job(self, fn, on_done, on_error, on_progress)
+        job.path = self.path
+        self.requests.put(job)
+        return job
+    
+    def submit_each(self, fn, on_done=None, on_error=None):
+        """Run fn(store, job) once on every worker thread, e.g. to set up
+        per-thread state, and call on_done with the list of results
+        
+        Each job waits at a barrier until every worker holds one, so no
+        worker takes two; a failed job breaks the barrier for the rest.
+        """
+        barrier = threading.Barrier(len(self.threads))
+        results = []
+        failures = []
+        
+        def run(store, job):
+            barrier.wait()
+            return fn(store, job)
+        
+        def collect(result):
+            results.append(result)
+            if len(results) == len(self.threads) and on_done:
+                on_done(results)
+        
+        def fail(e):
+            barrier.abort()
+            failures.append(e)
+            if len(failures) == 1 and on_error:
+                on_error(e)
+        
+        for _ in self.threads:
+            self.submit(run, collect, fail)
+    
+    def run(self, connect, preconnect):
+        """Worker loop: run jobs until shutdown, opening stores as needed"""
+        stores = {}
+        if preconnect:
+            # Open the database while the window is still being built;
+            # a failure is reported by the first job instead
+            path = self.path
+            try:
+                stores[path] = connect(path)
+            except Exception:
+                pass
+        
+        while True:
+            job = self.requests.get()
+            if job is None:
+                break
+            
+            store = None
+            try:
+                store = stores.pop(job.path, None)
+                if store is None:
+                    store = connect(job.path)
+                # Most recently used last; close the rest beyond the limit
+                stores[job.path] = store
+                while len(stores) > STORES_PER_WORKER:
+                    stores.pop(next(iter(stores))).close()
+                
+                job.check_cancelled()
+                if self.prepare:
+                    self.prepare(store)
+                if self.stats:
+                    result = self.stats.call('job', job.fn, store, job)
+                else:
+                    result = job.fn(store, job)
+            except Exception as e:
+                if store is not None and store.conn.in_transaction:
+                    store.conn.rollback()
+                self.completions.put((self.error_callback(job), (e,)))
+            else:
+                if job.on_done:
+                    self.completions.put((job.on_done, (result,)))
+        
+        for store in stores.values():
+            store.close()
+    
+    def error_callback(self, job):
+        if job.on_error:
+            return job.on_error
+        return lambda e: self.root.report_callback_exception(type(e), e, e.__traceback__)
+    
+    def poll(self):
+        """Deliver queued results to their callbacks on the Tk thread"""
+        while True:
+            try:
+                callback, args = self.completions.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if self.stats:
+                    self.stats.call('tk', callback, *args)
+                else:
+                    callback(*args)
+            except Exception:
+                traceback.print_exc()
+        self.poll_id = self.root.after(POLL_INTERVAL_MS, self.poll)
+    
+    def shutdown(self, timeout=None):
+        """Stop the workers after the queued jobs and close their connections"""
+        self.root.after_cancel(self.poll_id)
+        for thread in self.threads:
+            self.requests.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+
+def budget_changes(store, deltas):
+    """Return (month, category, status, amount) for each nonzero amount in a
+    {(month, category): amount} Counter, with status from store.budget_status
+    """
+    return [(month, category, store.budget_status(month, category), amount) 
+            for (month, category), amount in deltas.items() if amount]
+
 class PersonalExpenseTracker:
     
-    def __init__(self, root):
+    def __init__(self, root, timer=None, pragmas=None, perf_log=None, ledger=DEFAULT_LEDGER):
         self.root = root
+        self.timer = timer
+        self.pragmas = pragmas
+        self.ledger = ledger
+        
+        # Statement, job and callback timings, only collected with a perf_log
+        self.perf_log = perf_log
+        self.perf_stats = None
+        self.profiles = None
+        self.trace_sql = False
+        self.stats_window = None
+        self.stats_refresh = None
+        if perf_log:
+            import instrumentation
+            instrumentation.setup_log(perf_log)
+            self.perf_stats = instrumentation.PerfStats()
         self.root.title("Personal Expense Tracker - Abdul Hadi (F2022266615)")
         self.root.geometry("1200x800")
         self.root.configure(bg='#f0f0f0')
         
+        # Expense history paging state
+        self.list_filter = None
+        self.category_filter = None
+        self.list_total = 0
+        self.row_keys = []
+        self.has_more_pages = False
+        self.page_load_pending = False
+        self.list_generation = 0
+        
+        # Description search shown in the expense list instead of date pages
+        self.search_text = None
+        self.search_pending = None
+        
+        # Currently running cancellable job shown in the status bar
+        self.long_job = None
+        
+        # Open chart window, updated in place when the data changes
+        self.chart_view = None
+        self.chart_update_pending = None
+        
+        # Open spending trends window
+        self.trends_window = None
+        
+        # Open recurring expense rules window
+        self.recurring_window = None
+        
+        # Spending against budgets for budget_month, as {category: [spent, budget]},
+        # kept current from each add and delete
+        self.budget_month = None
+        self.budgets = {}
+        self.budget_window = None
+        
+        # Open bulk edit window and the expenses it applies to, as
+        # delete_expenses/update_expenses arguments
+        self.edit_window = None
+        self.edit_scope = None
+        
         # Initialize database
         self.init_database()
         
         # Create GUI
+        started = time.perf_counter()
         self.create_widgets()
+        if self.timer:
+            self.timer.record('create_widgets', started)
+        
+        # Add recurring expenses that came due since the last run; the worker
+        # runs jobs in order, so the first page below already includes them
+        self.materialize_recurring(refresh=False)
         
         # Load and display expenses
+        self.load_categories()
+        self.first_page_started = time.perf_counter()
         self.refresh_expense_list()
         
     def init_database(self):
-        """Initialize SQLite database and create tables if they don't exist"""
-        self.conn = sqlite3.connect('expenses.db')
-        self.cursor = self.conn.cursor()
-        
-        # Create expenses table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                category TEXT NOT NULL,
-                description TEXT,
-                date TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create categories table for suggestions
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL
-            )
-        ''')
+        """Start the database writer, which opens and initializes the ledger's
+        database, and the readers for long read-only jobs
+        """
+        def connect(path):
+            if self.perf_stats:
+                from instrumentation import profiled_connection
+                return ExpenseStore(path, self.pragmas, profiled_connection(self.perf_stats))
+            return ExpenseStore(path, self.pragmas)
         
-        # Insert default categories
-        default_categories = ['Food', 'Transportation', 'Entertainment', 'Shopping', 
-                            'Bills', 'Healthcare', 'Education', 'Others']
-        for category in default_categories:
-            self.cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
+        path = ledger_path(self.ledger, create=True)
+        writer_connect = connect
+        if self.timer:
+            # Opening and migrating the database happens on the worker thread
+            writer_connect = self.timer.timed('init_database', connect)
+        prepare = self.apply_sql_trace if self.perf_stats else None
+        self.db = DatabaseExecutor(self.root, writer_connect, path, self.perf_stats, 
+                                   preconnect=True, prepare=prepare)
         
-        self.conn.commit()
+        # Under WAL these read while the writer commits, so an export or
+        # backup never holds up adding expenses
+        self.readers = DatabaseExecutor(self.root, connect, path, self.perf_stats, 
+                                        workers=READER_WORKERS, name="database-reader", 
+                                        prepare=prepare)
     
     def create_widgets(self):
         """Create and arrange all GUI widgets"""
@@ -70,10 +389,10 @@ class PersonalExpenseTracker:
         main_frame.columnconfigure(1, weight=1)
         main_frame.rowconfigure(2, weight=1)
         
-        # Title
-        title_label = ttk.Label(main_frame, text="Personal Expense Tracker", 
-                               font=('Arial', 16, 'bold'))
-        title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
+        # Title naming the open ledger
+        self.title_label = ttk.Label(main_frame, text=f"Personal Expense Tracker - {self.ledger}", 
+                                     font=('Arial', 16, 'bold'))
+        self.title_label.grid(row=0, column=0, columnspan=3, pady=(0, 20))
         
         # Left Panel - Input Form
         self.create_input_panel(main_frame)
@@ -86,6 +405,95 @@ class PersonalExpenseTracker:
         
         # Chart Panel
         self.create_chart_panel(main_frame)
+        
+        # Status bar for background jobs
+        self.create_status_bar()
+        
+        self.create_menus()
+    
+    def create_menus(self):
+        """Create the menu bar with the Ledger and Backup menus, and the Debug
+        menu when instrumenting
+        """
+        menubar = tk.Menu(self.root)
+        self.ledger_var = tk.StringVar(value=self.ledger)
+        self.ledger_menu = tk.Menu(menubar, tearoff=0, postcommand=self.update_ledger_menu)
+        menubar.add_cascade(label="Ledger", menu=self.ledger_menu)
+        
+        backup_menu = tk.Menu(menubar, tearoff=0)
+        backup_menu.add_command(label="Full Snapshot...", command=self.save_snapshot)
+        backup_menu.add_command(label="Incremental Backup...", command=self.save_incremental_backup)
+        backup_menu.add_separator()
+        backup_menu.add_command(label="Restore Snapshot...", command=self.restore_snapshot)
+        menubar.add_cascade(label="Backup", menu=backup_menu)
+        if self.perf_stats:
+            self.create_debug_menu(menubar)
+        self.root.config(menu=menubar)
+    
+    def update_ledger_menu(self):
+        """List the ledgers on disk in the Ledger menu"""
+        self.ledger_menu.delete(0, 'end')
+        for name in list_ledgers():
+            self.ledger_menu.add_radiobutton(label=name, value=name, variable=self.ledger_var, 
+                                             command=lambda name=name: self.switch_ledger(name))
+        self.ledger_menu.add_separator()
+        self.ledger_menu.add_command(label="New Ledger...", command=self.new_ledger)
+    
+    def new_ledger(self):
+        """Ask for a name, then create and open that ledger"""
+        name = simpledialog.askstring("New Ledger", "Name of the new ledger:", parent=self.root)
+        if not name or not name.strip():
+            self.ledger_var.set(self.ledger)
+            return
+        name = name.strip()
+        try:
+            ledger_path(name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.switch_ledger(find_ledger(name))
+    
+    def switch_ledger(self, name):
+        """Show another ledger; jobs already submitted finish on the old one"""
+        self.ledger_var.set(name)
+        if name == self.ledger:
+            return
+        try:
+            path = ledger_path(name, create=True)
+        except (ValueError, OSError) as e:
+            self.ledger_var.set(self.ledger)
+            messagebox.showerror("Error", f"Could not open ledger: {str(e)}")
+            return
+        
+        self.ledger = name
+        self.db.path = path
+        self.readers.path = path
+        self.title_label.config(text=f"Personal Expense Tracker - {name}")
+        
+        # The bulk edit form applies to expenses of the old ledger
+        if self.edit_window:
+            self.close_edit_window()
+        self.materialize_recurring(refresh=False)
+        self.load_categories()
+        self.clear_filter()
+        if self.recurring_window:
+            self.load_recurring_rules()
+        if self.trends_window:
+            self.update_trends()
+    
+    def create_debug_menu(self, menubar):
+        """Add the Debug menu with the stats window, SQL tracing and profiling"""
+        debug_menu = tk.Menu(menubar, tearoff=0)
+        debug_menu.add_command(label="Performance Stats...", command=self.show_stats)
+        
+        self.trace_sql_var = tk.BooleanVar(value=False)
+        debug_menu.add_checkbutton(label="Trace SQL Statements", variable=self.trace_sql_var, 
+                                   command=self.toggle_sql_trace)
+        self.profiling_var = tk.BooleanVar(value=False)
+        debug_menu.add_checkbutton(label="Profile with cProfile", variable=self.profiling_var, 
+                                   command=self.toggle_profiling)
+        
+        menubar.add_cascade(label="Debug", menu=debug_menu)
     
     def create_input_panel(self, parent):
         """Create expense input form"""
@@ -101,10 +509,10 @@ class PersonalExpenseTracker:
         # Category
         ttk.Label(input_frame, text="Category:").grid(row=1, column=0, sticky=tk.W, pady=2)
         self.category_var = tk.StringVar()
-        self.categories = self.get_categories()
-        category_combo = ttk.Combobox(input_frame, textvariable=self.category_var, 
-                                     values=self.categories, width=13)
-        category_combo.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
+        self.categories = []
+        self.category_combo = ttk.Combobox(input_frame, textvariable=self.category_var, 
+                                          values=self.categories, width=13)
+        self.category_combo.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
         
         # Description
         ttk.Label(input_frame, text="Description:").grid(row=2, column=0, sticky=tk.W, pady=2)
@@ -139,33 +547,70 @@ class PersonalExpenseTracker:
         ttk.Label(filter_frame, text="(YYYY-MM)", font=('Arial', 8), 
                  foreground='gray').grid(row=0, column=2, sticky=tk.W, padx=(5, 0))
         
+        # Date range filter
+        ttk.Label(filter_frame, text="Or From:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.from_date_var = tk.StringVar()
+        from_entry = ttk.Entry(filter_frame, textvariable=self.from_date_var, width=10)
+        from_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
+        
+        ttk.Label(filter_frame, text="To:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.to_date_var = tk.StringVar()
+        to_entry = ttk.Entry(filter_frame, textvariable=self.to_date_var, width=10)
+        to_entry.grid(row=2, column=1, sticky=(tk.W, tk.E), pady=2)
+        
+        ttk.Label(filter_frame, text="(YYYY-MM-DD)", font=('Arial', 8), 
+                 foreground='gray').grid(row=2, column=2, sticky=tk.W, padx=(5, 0))
+        
+        # Category filter
+        ttk.Label(filter_frame, text="Category:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.filter_category_var = tk.StringVar(value="All")
+        self.filter_category_combo = ttk.Combobox(filter_frame, textvariable=self.filter_category_var, 
+                                                 values=["All"], width=10, state='readonly')
+        self.filter_category_combo.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=2)
+        
         # Filter buttons
         filter_btn = ttk.Button(filter_frame, text="Apply Filter", command=self.apply_filter)
-        filter_btn.grid(row=1, column=0, pady=5)
+        filter_btn.grid(row=4, column=0, pady=5)
         
         clear_filter_btn = ttk.Button(filter_frame, text="Clear Filter", command=self.clear_filter)
-        clear_filter_btn.grid(row=1, column=1, pady=5)
+        clear_filter_btn.grid(row=4, column=1, pady=5)
         
-        # Monthly total
-        self.total_label = ttk.Label(filter_frame, text="Total: Rs:0.00", 
+        # Monthly total with spending against budgets
+        total_frame = ttk.Frame(filter_frame)
+        total_frame.grid(row=5, column=0, columnspan=3, pady=10)
+        self.total_label = ttk.Label(total_frame, text="Total: Rs:0.00", 
                                     font=('Arial', 12, 'bold'))
-        self.total_label.grid(row=2, column=0, columnspan=3, pady=10)
+        self.total_label.pack()
+        self.budget_label = ttk.Label(total_frame, text="", font=('Arial', 9))
+        self.budget_label.pack()
         
         # Action buttons
-        ttk.Separator(filter_frame, orient='horizontal').grid(row=3, column=0, columnspan=3, 
+        ttk.Separator(filter_frame, orient='horizontal').grid(row=6, column=0, columnspan=3, 
                                                              sticky=(tk.W, tk.E), pady=10)
         
         export_btn = ttk.Button(filter_frame, text="Export to CSV", command=self.export_to_csv)
-        export_btn.grid(row=4, column=0, pady=2)
+        export_btn.grid(row=7, column=0, pady=2)
         
         chart_btn = ttk.Button(filter_frame, text="Show Charts", command=self.show_chart)
-        chart_btn.grid(row=4, column=1, pady=2)
+        chart_btn.grid(row=7, column=1, pady=2)
         
         backup_btn = ttk.Button(filter_frame, text="Backup Data", command=self.backup_data)
-        backup_btn.grid(row=5, column=0, pady=2)
+        backup_btn.grid(row=8, column=0, pady=2)
         
         restore_btn = ttk.Button(filter_frame, text="Restore Data", command=self.restore_data)
-        restore_btn.grid(row=5, column=1, pady=2)
+        restore_btn.grid(row=8, column=1, pady=2)
+        
+        import_btn = ttk.Button(filter_frame, text="Import CSV", command=self.import_from_csv)
+        import_btn.grid(row=9, column=0, pady=2)
+        
+        trends_btn = ttk.Button(filter_frame, text="Show Trends", command=self.show_trends)
+        trends_btn.grid(row=9, column=1, pady=2)
+        
+        recurring_btn = ttk.Button(filter_frame, text="Recurring...", command=self.show_recurring)
+        recurring_btn.grid(row=10, column=0, pady=2)
+        
+        budgets_btn = ttk.Button(filter_frame, text="Budgets...", command=self.show_budgets)
+        budgets_btn.grid(row=10, column=1, pady=2)
         
         filter_frame.columnconfigure(1, weight=1)
     
@@ -174,6 +619,15 @@ class PersonalExpenseTracker:
         list_frame = ttk.LabelFrame(parent, text="Expense History", padding="10")
         list_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         
+        # Description search, run as the user types
+        search_frame = ttk.Frame(list_frame)
+        search_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(search_frame, text="Search descriptions:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=40)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_var.trace_add('write', self.on_search_changed)
+        
         # Create Treeview
         columns = ('ID', 'Date', 'Category', 'Description', 'Amount')
         self.expense_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=15)
@@ -191,33 +645,110 @@ class PersonalExpenseTracker:
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.expense_tree.yview)
         h_scrollbar = ttk.Scrollbar(list_frame, orient=tk.HORIZONTAL, command=self.expense_tree.xview)
-        self.expense_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.v_scrollbar = v_scrollbar
+        self.expense_tree.configure(yscrollcommand=self.on_tree_scroll, xscrollcommand=h_scrollbar.set)
         
         # Grid layout
-        self.expense_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.expense_tree.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        v_scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        h_scrollbar.grid(row=2, column=0, sticky=(tk.W, tk.E))
         
-        # Delete button
-        delete_btn = ttk.Button(list_frame, text="Delete Selected", command=self.delete_expense)
-        delete_btn.grid(row=2, column=0, pady=10)
+        # Delete and edit the selected rows, or every expense the filter matches
+        button_frame = ttk.Frame(list_frame)
+        button_frame.grid(row=3, column=0, pady=10)
+        ttk.Button(button_frame, text="Delete Selected", command=self.delete_expense).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Edit Selected...", command=self.edit_selected).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Edit Filtered...", command=self.edit_filtered).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Delete Filtered", command=self.delete_filtered).pack(
+            side=tk.LEFT, padx=5)
         
         list_frame.columnconfigure(0, weight=1)
-        list_frame.rowconfigure(0, weight=1)
+        list_frame.rowconfigure(1, weight=1)
     
     def create_chart_panel(self, parent):
         """Create chart display panel (no longer needed as charts open in separate window)"""
         pass  # Charts now open in separate windows
     
-    def get_categories(self):
-        """Fetch categories from database"""
-        self.cursor.execute('SELECT name FROM categories ORDER BY name')
-        return [row[0] for row in self.cursor.fetchall()]
+    def create_status_bar(self):
+        """Create the status bar showing background job progress"""
+        status_frame = ttk.Frame(self.root, padding=(10, 2))
+        status_frame.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        status_frame.columnconfigure(0, weight=1)
+        
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status_var).grid(row=0, column=0, sticky=tk.W)
+        
+        self.status_progress = ttk.Progressbar(status_frame, orient=tk.HORIZONTAL, length=200, 
+                                              mode='determinate', maximum=100)
+        self.status_progress.grid(row=0, column=1, padx=5)
+        
+        self.cancel_btn = ttk.Button(status_frame, text="Cancel", command=self.cancel_long_job, 
+                                    state=tk.DISABLED)
+        self.cancel_btn.grid(row=0, column=2)
+    
+    def run_long_job(self, description, fn, on_done, error_text, on_cancel=None, readonly=False, 
+                     unit="records"):
+        """Run a cancellable job on the database writer, or with readonly on a
+        reader, with status bar progress counted in unit
+        """
+        if self.long_job:
+            messagebox.showwarning("Warning", "Please wait for the current operation to finish")
+            return
+        
+        def on_progress(count, fraction):
+            self.status_var.set(f"{description}: {count} {unit}")
+            if fraction is not None:
+                self.status_progress['value'] = min(100, fraction * 100)
+        
+        def finish(status):
+            self.long_job = None
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.status_progress['value'] = 0
+            self.status_var.set(status)
+        
+        def on_success(result):
+            finish("Ready")
+            on_done(result)
+        
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                finish(f"{description} cancelled")
+                if on_cancel:
+                    on_cancel()
+            else:
+                finish("Ready")
+                messagebox.showerror("Error", f"{error_text}: {str(e)}")
+        
+        self.status_var.set(f"{description}...")
+        self.cancel_btn.config(state=tk.NORMAL)
+        executor = self.readers if readonly else self.db
+        self.long_job = executor.submit(fn, on_success, on_error, on_progress)
+    
+    def cancel_long_job(self):
+        """Cancel the running background job"""
+        if self.long_job:
+            self.long_job.cancel()
+            self.status_var.set("Cancelling...")
+    
+    def load_categories(self):
+        """Fetch categories from database into the category combobox"""
+        def fetch(store, job):
+            return store.get_categories()
+        
+        def on_done(categories):
+            self.categories = categories
+            self.category_combo['values'] = categories
+            self.filter_category_combo['values'] = ["All"] + categories
+        
+        self.db.submit(fetch, on_done)
     
     def add_expense(self):
         """Add new expense to database"""
         try:
-            amount = float(self.amount_var.get())
+            amount = parse_amount(self.amount_var.get())
             category = self.category_var.get().strip()
             description = self.description_var.get().strip()
             expense_date = self.date_var.get().strip()
@@ -226,112 +757,569 @@ class PersonalExpenseTracker:
                 messagebox.showerror("Error", "Please select a category")
                 return
             
-            # Validate date format
+            # Validate date format; the range filters and rollup need zero-padded ISO dates
             try:
-                datetime.strptime(expense_date, "%Y-%m-%d")
+                parse_date(expense_date)
             except ValueError:
                 messagebox.showerror("Error", "Please enter date in YYYY-MM-DD format")
                 return
             
             # Insert into database
-            self.cursor.execute('''
-                INSERT INTO expenses (amount, category, description, date)
-                VALUES (?, ?, ?, ?)
-            ''', (amount, category, description, expense_date))
-            
-            # Add category if new
-            self.cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
+            ledger = self.ledger
             
-            self.conn.commit()
+            def insert(store, job):
+                expense_id = store.add_expense(amount, category, description, expense_date)
+                return expense_id, store.budget_status(expense_date[:7], category)
             
-            # Clear form
-            self.amount_var.set("")
-            self.category_var.set("")
-            self.description_var.set("")
-            self.date_var.set(date.today().strftime("%Y-%m-%d"))
+            def on_done(result):
+                expense_id, budget = result
+                # Clear form
+                self.amount_var.set("")
+                self.category_var.set("")
+                self.description_var.set("")
+                self.date_var.set(date.today().strftime("%Y-%m-%d"))
+                
+                # Update display in place, unless another ledger was opened meanwhile
+                if ledger == self.ledger:
+                    self.insert_expense_row(expense_id, expense_date, category, description, amount)
+                    if category not in self.categories:
+                        self.load_categories()
+                
+                messagebox.showinfo("Success", "Expense added successfully!")
+                if ledger == self.ledger:
+                    self.update_budget(expense_date[:7], category, budget, amount)
             
-            # Refresh display
-            self.refresh_expense_list()
-            self.categories = self.get_categories()
+            def on_error(e):
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
             
-            messagebox.showinfo("Success", "Expense added successfully!")
+            self.db.submit(insert, on_done, on_error)
             
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid amount")
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
     
-    def refresh_expense_list(self, filter_month=None):
-        """Refresh the expense list display"""
+    def refresh_expense_list(self, filter_range=None, category=None):
+        """Reset the expense list and load the first page of results
+        
+        filter_range is a half-open (start, end) pair of YYYY-MM-DD dates.
+        """
         # Clear existing items
-        for item in self.expense_tree.get_children():
-            self.expense_tree.delete(item)
-        
-        # Fetch expenses
-        if filter_month:
-            self.cursor.execute('''
-                SELECT id, date, category, description, amount 
-                FROM expenses 
-                WHERE date LIKE ?
-                ORDER BY date DESC, id DESC
-            ''', (f"{filter_month}%",))
+        started = time.perf_counter()
+        rows = self.expense_tree.get_children()
+        self.expense_tree.delete(*rows)
+        if self.perf_stats:
+            self.perf_stats.timed('tk', 'refresh_expense_list: clear rows', started, len(rows))
+        
+        # Results of requests made for an older filter are ignored
+        self.list_generation += 1
+        generation = self.list_generation
+        
+        self.list_filter = filter_range
+        self.category_filter = category
+        self.row_keys = []
+        self.has_more_pages = True
+        self.load_next_page()
+        self.schedule_chart_update()
+        
+        # Total comes from the rollup so it does not depend on loaded pages
+        def fetch_total(store, job):
+            return store.total(filter_range, category)
+        
+        def on_done(total):
+            if generation == self.list_generation:
+                self.list_total = total
+                self.update_total_label()
+        
+        self.db.submit(fetch_total, on_done)
+        self.load_budgets()
+    
+    def update_total_label(self):
+        """Show the running total for the current filter"""
+        if self.list_filter or self.category_filter:
+            label = describe_filter(self.list_filter, self.category_filter)
+            self.total_label.config(text=f"Total for {label}: Rs:{format_amount(self.list_total)}")
         else:
-            self.cursor.execute('''
-                SELECT id, date, category, description, amount 
-                FROM expenses 
-                ORDER BY date DESC, id DESC
-            ''')
+            self.total_label.config(text=f"Total: Rs:{format_amount(self.list_total)}")
+    
+    def load_budgets(self):
+        """Fetch spending against budgets for the filtered month, or the
+        current month when the filter is not a single month
+        """
+        month = date.today().strftime("%Y-%m")
+        if self.list_filter and self.list_filter[0]:
+            start_month = self.list_filter[0][:7]
+            if month_range(start_month) == tuple(self.list_filter):
+                month = start_month
+        
+        def fetch(store, job):
+            return store.get_budgets(month)
+        
+        def on_done(budgets):
+            self.budget_month = month
+            self.budgets = {category: [spent, budget] for category, spent, budget in budgets}
+            self.update_budget_label()
+            if self.budget_window:
+                self.display_budgets()
+        
+        self.db.submit(fetch, on_done)
+    
+    def update_budget(self, month, category, status, amount):
+        """Apply the (spent, budget) status of a category after an expense of
+        amount was added (or, when negative, deleted) and alert when spending
+        crosses a budget threshold
+        """
+        self.update_budgets([(month, category, status, amount)])
+    
+    def update_budgets(self, changes):
+        """Apply (month, category, status, amount) changes as update_budget
+        does, with one alert listing every threshold crossed
+        """
+        alerts = []
+        shown = False
+        for month, category, status, amount in changes:
+            if status is None:
+                continue
+            spent, budget = status
+            if month == self.budget_month:
+                self.budgets[category] = [spent, budget]
+                shown = True
+            if crossed_budget_threshold(spent - amount, spent, budget):
+                alerts.append(describe_budget(category, month, spent, budget))
         
-        expenses = self.cursor.fetchall()
-        total = 0
+        if shown:
+            self.update_budget_label()
+            if self.budget_window:
+                self.display_budgets()
+        if alerts:
+            messagebox.showwarning("Budget", "\n".join(alerts))
+    
+    def update_budget_label(self):
+        """Show spending against budgets next to the total"""
+        if self.category_filter in self.budgets:
+            spent, budget = self.budgets[self.category_filter]
+            text = describe_budget(self.category_filter, self.budget_month, spent, budget)
+            reached = budget_threshold(spent, budget)
+        elif self.budgets:
+            over = [category for category, (spent, budget) in self.budgets.items() if spent > budget]
+            spent = sum(spent for spent, budget in self.budgets.values())
+            budget = sum(budget for spent, budget in self.budgets.values())
+            text = (f"Budgets for {self.budget_month}: Rs:{format_amount(spent)} "
+                    f"of Rs:{format_amount(budget)}")
+            if over:
+                text += f"; over in {', '.join(over)}"
+            reached = BUDGET_THRESHOLDS[-1] if over else budget_threshold(spent, budget)
+        else:
+            self.budget_label.config(text="")
+            return
         
-        # Insert into treeview
+        if reached is None:
+            color = 'green'
+        elif reached < BUDGET_THRESHOLDS[-1]:
+            color = 'orange'
+        else:
+            color = 'red'
+        self.budget_label.config(text=text, foreground=color)
+    
+    def load_next_page(self):
+        """Request the next keyset page of expenses for the treeview"""
+        if not self.has_more_pages:
+            self.page_load_pending = False
+            return
+        
+        self.page_load_pending = True
+        generation = self.list_generation
+        filter_range = self.list_filter
+        category = self.category_filter
+        search_text = self.search_text
+        after = self.row_keys[-1] if self.row_keys else None
+        
+        def fetch(store, job):
+            if search_text:
+                # Ranked matches arrive in one batch
+                return store.search(search_text, filter_range, category)
+            return store.fetch_page(filter_range, category, after)
+        
+        def on_done(expenses):
+            if generation == self.list_generation:
+                self.append_page(expenses)
+        
+        self.db.submit(fetch, on_done)
+    
+    def append_page(self, expenses):
+        """Append a fetched page to the treeview"""
+        self.page_load_pending = False
+        
+        # Insert into treeview, keyed by expense id
+        started = time.perf_counter()
         for expense in expenses:
-            self.expense_tree.insert('', 'end', values=(
+            self.expense_tree.insert('', 'end', iid=str(expense[0]), values=(
                 expense[0], expense[1], expense[2], 
-                expense[3] or '', f"Rs:{expense[4]:.2f}"
+                expense[3] or '', f"Rs:{format_amount(expense[4])}"
             ))
-            total += expense[4]
+        if self.perf_stats:
+            self.perf_stats.timed('tk', 'append_page: insert rows', started, len(expenses))
         
-        # Update total label
-        if filter_month:
-            self.total_label.config(text=f"Total for {filter_month}: Rs:{total:.2f}")
-        else:
-            self.total_label.config(text=f"Total: Rs:{total:.2f}")
+        self.row_keys.extend((expense[1], expense[0]) for expense in expenses)
+        self.has_more_pages = not self.search_text and len(expenses) == PAGE_SIZE
+        
+        if self.timer and self.first_page_started:
+            self.timer.record('refresh_expense_list', self.first_page_started)
+            self.first_page_started = None
+            self.root.after_idle(self.timer.report)
+    
+    def on_tree_scroll(self, first, last):
+        """Update the scrollbar and prefetch the next page near the bottom"""
+        self.v_scrollbar.set(first, last)
+        
+        if not self.has_more_pages or self.page_load_pending:
+            return
+        
+        remaining = (1.0 - float(last)) * len(self.row_keys)
+        if remaining < PREFETCH_MARGIN:
+            self.load_next_page()
+    
+    def in_list_filter(self, expense_date, category):
+        """Check whether an expense falls inside the active list filter"""
+        if self.category_filter and category != self.category_filter:
+            return False
+        if not self.list_filter:
+            return True
+        start, end = self.list_filter
+        return (not start or expense_date >= start) and (not end or expense_date < end)
+    
+    def find_row_position(self, key):
+        """Binary search the loaded (date, id) keys, which are sorted descending"""
+        low, high = 0, len(self.row_keys)
+        while low < high:
+            mid = (low + high) // 2
+            if self.row_keys[mid] > key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+    
+    def insert_expense_row(self, expense_id, expense_date, category, description, amount):
+        """Insert a newly added expense at its sorted position without reloading"""
+        self.insert_expense_rows([(expense_id, expense_date, category, description, amount)])
+    
+    def insert_expense_rows(self, rows):
+        """Insert added or edited (id, date, category, description, amount)
+        expenses at their sorted positions without reloading
+        """
+        rows = [row for row in rows if self.in_list_filter(row[1], row[2])]
+        if not rows:
+            return
+        
+        self.list_total += sum(row[4] for row in rows)
+        self.update_total_label()
+        self.schedule_chart_update()
+        
+        if self.search_text:
+            # Search results are ranked, not dated; rerun the search instead
+            self.refresh_expense_list(self.list_filter, self.category_filter)
+            return
+        
+        for expense_id, expense_date, category, description, amount in rows:
+            key = (expense_date, expense_id)
+            position = self.find_row_position(key)
+            if position == len(self.row_keys) and self.has_more_pages:
+                # Row sorts after the loaded window; paging will fetch it
+                continue
+            
+            self.row_keys.insert(position, key)
+            self.expense_tree.insert('', position, iid=str(expense_id), values=(
+                expense_id, expense_date, category, 
+                description or '', f"Rs:{format_amount(amount)}"
+            ))
+    
+    def remove_expense_row(self, expense_id, expense_date, category, amount):
+        """Remove a deleted expense from the list and adjust the total"""
+        self.remove_expense_rows([(expense_id, expense_date, category, amount)])
+    
+    def remove_expense_rows(self, rows):
+        """Remove deleted or edited (id, date, category, amount) expenses from
+        the list and adjust the total
+        """
+        rows = [row for row in rows if self.in_list_filter(row[1], row[2])]
+        if not rows:
+            return
+        
+        self.list_total -= sum(row[3] for row in rows)
+        self.update_total_label()
+        self.schedule_chart_update()
+        
+        if len(rows) == 1 and not self.search_text:
+            key = (rows[0][1], rows[0][0])
+            position = self.find_row_position(key)
+            if position < len(self.row_keys) and self.row_keys[position] == key:
+                del self.row_keys[position]
+                self.expense_tree.delete(str(key[1]))
+            return
+        
+        # One pass over the loaded rows, which search results are not sorted by
+        removed = {(expense_date, expense_id) for expense_id, expense_date, _, _ in rows}
+        loaded = [key for key in self.row_keys if key in removed]
+        if loaded:
+            self.row_keys = [key for key in self.row_keys if key not in removed]
+            self.expense_tree.delete(*(str(expense_id) for _, expense_id in loaded))
     
     def apply_filter(self):
-        """Apply month filter"""
+        """Apply month or date range filter and category filter"""
         month_filter = self.month_var.get().strip()
+        from_date = self.from_date_var.get().strip()
+        to_date = self.to_date_var.get().strip()
+        category = self.filter_category_var.get()
+        category = None if category == "All" else category
+        
+        filter_range = None
         if month_filter:
             try:
-                # Validate format
-                datetime.strptime(month_filter + "-01", "%Y-%m-%d")
-                self.refresh_expense_list(month_filter)
+                # month_range validates the format
+                filter_range = month_range(month_filter)
             except ValueError:
                 messagebox.showerror("Error", "Please enter month in YYYY-MM format")
-        else:
-            messagebox.showwarning("Warning", "Please enter a month to filter")
+                return
+        elif from_date or to_date:
+            try:
+                filter_range = date_range(from_date, to_date)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter dates in YYYY-MM-DD format")
+                return
+        elif not category:
+            messagebox.showwarning("Warning", "Please enter a month, date range or category to filter")
+            return
+        
+        self.refresh_expense_list(filter_range, category)
     
     def clear_filter(self):
         """Clear all filters"""
         self.month_var.set("")
+        self.from_date_var.set("")
+        self.to_date_var.set("")
+        self.filter_category_var.set("All")
+        self.search_text = None
+        self.search_var.set("")
         self.refresh_expense_list()
     
+    def on_search_changed(self, *args):
+        """Restart the search delay on every keystroke"""
+        if self.search_pending:
+            self.root.after_cancel(self.search_pending)
+        self.search_pending = self.root.after(SEARCH_DELAY_MS, self.apply_search)
+    
+    def apply_search(self):
+        """Show expenses whose description matches the search box, within the
+        current filter; text without searchable words shows the full list
+        """
+        self.search_pending = None
+        text = self.search_var.get().strip()
+        search_text = text if search_query(text) else None
+        if search_text == self.search_text:
+            return
+        self.search_text = search_text
+        self.refresh_expense_list(self.list_filter, self.category_filter)
+    
     def delete_expense(self):
-        """Delete selected expense"""
-        selected_item = self.expense_tree.selection()
-        if not selected_item:
+        """Delete the selected expenses"""
+        selected_items = self.expense_tree.selection()
+        if not selected_items:
             messagebox.showwarning("Warning", "Please select an expense to delete")
             return
         
-        if messagebox.askyesno("Confirm", "Are you sure you want to delete this expense?"):
-            expense_id = self.expense_tree.item(selected_item[0])['values'][0]
-            
-            self.cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-            self.conn.commit()
+        if len(selected_items) == 1:
+            question = "Are you sure you want to delete this expense?"
+        else:
+            question = f"Are you sure you want to delete these {len(selected_items)} expenses?"
+        if messagebox.askyesno("Confirm", question):
+            self.delete_expenses(self.selection_scope())
+    
+    def delete_filtered(self):
+        """Delete every expense matching the filter and search"""
+        scope = self.filter_scope()
+        if scope and messagebox.askyesno("Confirm", f"Are you sure you want to delete "
+                                         f"{self.describe_scope(scope)}?"):
+            self.delete_expenses(scope)
+    
+    def selection_scope(self):
+        """Return the selected rows as bulk change arguments"""
+        return {'ids': [int(item) for item in self.expense_tree.selection()]}
+    
+    def filter_scope(self):
+        """Return the filter and search as bulk change arguments, or warn and
+        return None when nothing is filtered
+        """
+        if not (self.list_filter or self.category_filter or self.search_text):
+            messagebox.showwarning("Warning", "Please apply a filter or search first")
+            return None
+        return {'date_range': self.list_filter, 'category': self.category_filter, 
+                'text': self.search_text}
+    
+    def describe_scope(self, scope):
+        """Describe the expenses a bulk change applies to"""
+        if 'ids' in scope:
+            count = len(scope['ids'])
+            return "the selected expense" if count == 1 else f"the {count} selected expenses"
+        words = ["all expenses"]
+        label = describe_filter(scope['date_range'], scope['category'])
+        if label:
+            words.append(f"in {label}")
+        if scope['text']:
+            words.append(f'matching "{scope["text"]}"')
+        return " ".join(words)
+    
+    def delete_expenses(self, scope):
+        """Delete the expenses in scope with one statement on the database
+        worker, then update the list, total and budgets in place
+        """
+        ledger = self.ledger
+        
+        def delete(store, job):
+            rows = store.delete_expenses(**scope)
+            deltas = Counter()
+            for expense_id, expense_date, category, amount in rows:
+                deltas[(expense_date[:7], category)] -= amount
+            return rows, budget_changes(store, deltas)
+        
+        def on_done(result):
+            rows, budgets = result
+            if ledger == self.ledger:
+                self.remove_expense_rows(rows)
+                self.update_budgets(budgets)
+            if len(rows) == 1:
+                messagebox.showinfo("Success", "Expense deleted successfully!")
+            else:
+                messagebox.showinfo("Success", f"Deleted {len(rows)} expenses")
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Delete failed: {str(e)}")
+        
+        self.db.submit(delete, on_done, on_error)
+    
+    def edit_selected(self):
+        """Open the bulk edit window for the selected expenses"""
+        if not self.expense_tree.selection():
+            messagebox.showwarning("Warning", "Please select expenses to edit")
+            return
+        self.show_bulk_edit(self.selection_scope())
+    
+    def edit_filtered(self):
+        """Open the bulk edit window for every expense matching the filter and search"""
+        scope = self.filter_scope()
+        if scope:
+            self.show_bulk_edit(scope)
+    
+    def show_bulk_edit(self, scope):
+        """Open the bulk edit window for the expenses in scope, or point the
+        open one at them
+        """
+        self.edit_scope = scope
+        if self.edit_window:
+            self.edit_window.lift()
+        else:
+            self.create_edit_window()
+        self.edit_window.title(f"Edit {self.describe_scope(scope)}")
+    
+    def create_edit_window(self):
+        """Create the bulk edit form; blank fields keep their current values"""
+        self.edit_window = tk.Toplevel(self.root)
+        self.edit_window.geometry("450x200")
+        self.edit_window.transient(self.root)
+        self.edit_window.protocol("WM_DELETE_WINDOW", self.close_edit_window)
+        
+        form = ttk.Frame(self.edit_window, padding="10")
+        form.pack(fill=tk.BOTH, expand=True)
+        
+        self.edit_category_var = tk.StringVar()
+        self.edit_description_var = tk.StringVar()
+        self.edit_date_var = tk.StringVar()
+        
+        ttk.Label(form, text="Leave a field blank to keep its current values").grid(
+            row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
+        ttk.Label(form, text="Category:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(form, textvariable=self.edit_category_var, values=self.categories, 
+                     width=30).grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Description:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=self.edit_description_var, width=30).grid(
+            row=2, column=1, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Date (YYYY-MM-DD):").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=self.edit_date_var, width=30).grid(
+            row=3, column=1, sticky=(tk.W, tk.E), pady=2)
+        
+        button_frame = ttk.Frame(form)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=(10, 0))
+        ttk.Button(button_frame, text="Apply", command=self.apply_bulk_edit).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.close_edit_window).pack(
+            side=tk.LEFT, padx=5)
+        
+        form.columnconfigure(1, weight=1)
+    
+    def apply_bulk_edit(self):
+        """Apply the bulk edit form to the expenses in edit_scope with one
+        statement on the database worker, then update the list in place
+        """
+        changes = {}
+        category = self.edit_category_var.get().strip()
+        description = self.edit_description_var.get().strip()
+        expense_date = self.edit_date_var.get().strip()
+        if category:
+            changes['category'] = category
+        if description:
+            changes['description'] = description
+        if expense_date:
+            try:
+                parse_date(expense_date)
+            except ValueError:
+                messagebox.showerror("Error", "Please enter date in YYYY-MM-DD format")
+                return
+            changes['date'] = expense_date
+        if not changes:
+            messagebox.showwarning("Warning", "Please enter a category, description or date")
+            return
+        
+        scope = self.edit_scope
+        ledger = self.ledger
+        
+        def update(store, job):
+            rows = store.update_expenses(changes, **scope)
+            edited = []
+            deltas = Counter()
+            for expense_id, old_date, old_category, old_description, amount in rows:
+                new_date = changes.get('date', old_date)
+                new_category = changes.get('category', old_category)
+                edited.append((expense_id, new_date, new_category, 
+                               changes.get('description', old_description), amount))
+                deltas[(old_date[:7], old_category)] -= amount
+                deltas[(new_date[:7], new_category)] += amount
+            return rows, edited, budget_changes(store, deltas)
+        
+        def on_done(result):
+            rows, edited, budgets = result
+            if self.edit_window:
+                self.close_edit_window()
+            if ledger == self.ledger:
+                # Edited rows may move or leave the filter; take them out and
+                # put them back where their new values sort
+                self.remove_expense_rows([(row[0], row[1], row[2], row[4]) for row in rows])
+                self.insert_expense_rows(edited)
+                if 'category' in changes and changes['category'] not in self.categories:
+                    self.load_categories()
             
-            self.refresh_expense_list()
-            messagebox.showinfo("Success", "Expense deleted successfully!")
+            messagebox.showinfo("Success", f"Updated {len(rows)} expenses")
+            if ledger == self.ledger:
+                self.update_budgets(budgets)
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Edit failed: {str(e)}")
+        
+        self.db.submit(update, on_done, on_error)
+    
+    def close_edit_window(self):
+        """Destroy the bulk edit window"""
+        self.edit_window.destroy()
+        self.edit_window = None
+        self.edit_scope = None
     
     def export_to_csv(self):
         """Export expenses to CSV file"""
@@ -344,138 +1332,125 @@ class PersonalExpenseTracker:
             
             if filename:
                 # Get current filter
-                month_filter = self.month_var.get().strip()
+                filter_range = self.list_filter
+                category = self.category_filter
                 
-                if month_filter:
-                    self.cursor.execute('''
-                        SELECT date, category, description, amount 
-                        FROM expenses 
-                        WHERE date LIKE ?
-                        ORDER BY date DESC
-                    ''', (f"{month_filter}%",))
-                else:
-                    self.cursor.execute('''
-                        SELECT date, category, description, amount 
-                        FROM expenses 
-                        ORDER BY date DESC
-                    ''')
+                def export(store, job):
+                    # Row count for progress comes from the rollup
+                    total_rows = store.count(filter_range, category) or 1
+                    
+                    with open(filename, 'w', newline='', encoding='utf-8', 
+                              buffering=1 << 20) as csvfile:
+                        steps = store.export_csv(csvfile, filter_range, category)
+                        return job.run_steps(steps, lambda count: count / total_rows)
                 
-                expenses = self.cursor.fetchall()
+                def on_done(count):
+                    messagebox.showinfo("Success", f"Exported {count} records to {filename}")
                 
-                with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(['Date', 'Category', 'Description', 'Amount'])
-                    
-                    for expense in expenses:
-                        writer.writerow([
-                            expense[0], expense[1], 
-                            expense[2] or '', expense[3]
-                        ])
+                def on_cancel():
+                    if os.path.exists(filename):
+                        os.remove(filename)
                 
-                messagebox.showinfo("Success", f"Data exported to {filename}")
+                self.run_long_job("Exporting", export, on_done, "Export failed", on_cancel, 
+                                  readonly=True)
         
         except Exception as e:
             messagebox.showerror("Error", f"Export failed: {str(e)}")
     
-    def show_chart(self):
-        """Display pie chart of expenses by category in a separate window"""
-        try:
-            # Get current filter
-            month_filter = self.month_var.get().strip()
-            
-            if month_filter:
-                self.cursor.execute('''
-                    SELECT category, SUM(amount) 
-                    FROM expenses 
-                    WHERE date LIKE ?
-                    GROUP BY category
-                    ORDER BY SUM(amount) DESC
-                ''', (f"{month_filter}%",))
-                title_suffix = f" for {month_filter}"
-            else:
-                self.cursor.execute('''
-                    SELECT category, SUM(amount) 
-                    FROM expenses 
-                    GROUP BY category
-                    ORDER BY SUM(amount) DESC
-                ''')
-                title_suffix = ""
-            
-            data = self.cursor.fetchall()
-            
-            if not data:
-                messagebox.showinfo("Info", "No data available for chart")
-                return
-            
-            # Create separate window for chart
-            chart_window = tk.Toplevel(self.root)
-            chart_window.title(f"Expense Chart{title_suffix}")
-            chart_window.geometry("900x700")
-            chart_window.configure(bg='white')
-            
-            # Make window modal (optional)
-            chart_window.transient(self.root)
-            chart_window.grab_set()
-            
-            # Create frame for chart
-            chart_frame = ttk.Frame(chart_window, padding="10")
-            chart_frame.pack(fill=tk.BOTH, expand=True)
-            
-            # Get categories and amounts
-            categories = [row[0] for row in data]
-            amounts = [row[1] for row in data]
-            
-            # Create figure with subplots for both pie and bar chart
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-            
-            # Pie chart
-            wedges, texts, autotexts = ax1.pie(amounts, labels=categories, autopct='%1.1f%%', 
-                                              startangle=90)
-            ax1.set_title(f'Expense Distribution{title_suffix}', fontsize=12, fontweight='bold')
-            
-            # Bar chart
-            bars = ax2.bar(categories, amounts, color=plt.cm.Set3(range(len(categories))))
-            ax2.set_title(f'Expense Amounts by Category{title_suffix}', fontsize=12, fontweight='bold')
-            ax2.set_xlabel('Category')
-            ax2.set_ylabel('Amount (Rs)')
-            ax2.tick_params(axis='x', rotation=45)
-            
-            # Add value labels on bars
-            for bar, amount in zip(bars, amounts):
-                height = bar.get_height()
-                ax2.text(bar.get_x() + bar.get_width()/2., height + max(amounts)*0.01,
-                        f'Rs:{amount:.2f}', ha='center', va='bottom', fontsize=9)
-            
-            plt.tight_layout()
-            
-            # Create canvas
-            canvas = FigureCanvasTkAgg(fig, chart_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            
-            # Button frame
-            button_frame = ttk.Frame(chart_frame)
-            button_frame.pack(fill=tk.X, pady=10)
+    def import_from_csv(self):
+        """Import expenses from a CSV file, skipping rows that already exist"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            title="Select CSV file to import"
+        )
+        if not filename:
+            return
+        
+        stats = {}
+        
+        def run_import(store, job):
+            # Progress follows the position in the file
+            size = os.path.getsize(filename) or 1
             
-            # Close button
-            close_btn = ttk.Button(button_frame, text="Close Chart", 
-                                  command=chart_window.destroy)
-            close_btn.pack(side=tk.RIGHT, padx=5)
+            with open(filename, 'rb') as raw, \
+                    io.TextIOWrapper(raw, encoding='utf-8-sig', newline='') as f:
+                steps = store.import_csv(f, stats)
+                return job.run_steps(steps, lambda count: raw.tell() / size)
+        
+        def on_done(count):
+            self.refresh_expense_list(self.list_filter, self.category_filter)
+            self.load_categories()
             
-            # Export chart button
-            export_chart_btn = ttk.Button(button_frame, text="Save Chart as PNG", 
-                                         command=lambda: self.save_chart(fig))
-            export_chart_btn.pack(side=tk.RIGHT, padx=5)
+            message = (f"Imported {stats['imported']} of {count} rows\n"
+                       f"Skipped {stats['duplicates']} duplicates and {stats['invalid']} invalid rows")
+            if stats['errors']:
+                message += "\n\n" + "\n".join(stats['errors'])
+            messagebox.showinfo("Import Complete", message)
+        
+        self.run_long_job("Importing", run_import, on_done, "Import failed")
+    
+    def show_chart(self):
+        """Open the chart window, or bring it forward, and fill it for the current filter"""
+        if self.chart_view:
+            self.chart_view.lift()
+        self.update_chart(open_window=True)
+    
+    def update_chart(self, open_window=False):
+        """Fetch category totals for the current filter and redraw the charts"""
+        self.chart_update_pending = None
+        filter_range = self.list_filter
+        category = self.category_filter
+        generation = self.list_generation
+        label = describe_filter(filter_range, category)
+        title_suffix = f" for {label}" if label else ""
+        
+        def fetch(store, job):
+            # Charts are drawn in rupees
+            return [(name, total / 100) for name, total in store.category_totals(filter_range, category)]
+        
+        def on_done(data):
+            if generation == self.list_generation:
+                self.display_chart(data, title_suffix, open_window)
+            elif open_window:
+                # The filter changed meanwhile; open the window with fresh totals
+                self.update_chart(open_window=True)
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Chart generation failed: {str(e)}")
+        
+        self.db.submit(fetch, on_done, on_error)
+    
+    def schedule_chart_update(self):
+        """Coalesce data changes into one chart refresh while the window is open"""
+        if self.chart_view and not self.chart_update_pending:
+            self.chart_update_pending = self.root.after(CHART_UPDATE_DELAY_MS, self.update_chart)
+    
+    def display_chart(self, data, title_suffix, open_window=False):
+        """Display pie and bar charts of expenses by category in the chart window"""
+        try:
+            if not self.chart_view:
+                if not open_window:
+                    return
+                if not data:
+                    messagebox.showinfo("Info", "No data available for chart")
+                    return
+                
+                # matplotlib is imported on first use to keep startup fast
+                from chart_view import ChartView
+                self.chart_view = ChartView(self.root, self.save_chart, self.on_chart_closed)
             
-            # Center the window
-            chart_window.update_idletasks()
-            x = (chart_window.winfo_screenwidth() // 2) - (chart_window.winfo_width() // 2)
-            y = (chart_window.winfo_screenheight() // 2) - (chart_window.winfo_height() // 2)
-            chart_window.geometry(f"+{x}+{y}")
+            self.chart_view.update(data, title_suffix)
             
         except Exception as e:
             messagebox.showerror("Error", f"Chart generation failed: {str(e)}")
     
+    def on_chart_closed(self):
+        """Forget the chart window once it has released its figure"""
+        self.chart_view = None
+        if self.chart_update_pending:
+            self.root.after_cancel(self.chart_update_pending)
+            self.chart_update_pending = None
+    
     def save_chart(self, fig):
         """Save chart as PNG file"""
         try:
@@ -492,40 +1467,525 @@ class PersonalExpenseTracker:
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save chart: {str(e)}")
     
+    def show_trends(self):
+        """Open the trends window, or bring it forward, and fill it for the current filter"""
+        if self.trends_window:
+            self.trends_window.lift()
+        else:
+            self.create_trends_window()
+        self.update_trends()
+    
+    def create_trends_window(self):
+        """Create the window listing spend per period, category changes and a forecast"""
+        self.trends_window = tk.Toplevel(self.root)
+        self.trends_window.geometry("700x600")
+        self.trends_window.transient(self.root)
+        self.trends_window.protocol("WM_DELETE_WINDOW", self.close_trends_window)
+        
+        trends_frame = ttk.Frame(self.trends_window, padding="10")
+        trends_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Period selector
+        period_frame = ttk.Frame(trends_frame)
+        period_frame.pack(fill=tk.X)
+        ttk.Label(period_frame, text="Period:").pack(side=tk.LEFT)
+        self.trends_period_var = tk.StringVar(value="month")
+        period_combo = ttk.Combobox(period_frame, textvariable=self.trends_period_var, 
+                                    values=["day", "week", "month"], width=10, state='readonly')
+        period_combo.pack(side=tk.LEFT, padx=5)
+        period_combo.bind('<<ComboboxSelected>>', lambda event: self.update_trends())
+        
+        # Spend series, oldest first
+        columns = ('Period', 'Total', 'Average (3)', 'Change', 'Change %')
+        series_frame = ttk.LabelFrame(trends_frame, text="Spending", padding="5")
+        series_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        self.trends_tree = ttk.Treeview(series_frame, columns=columns, show='headings', height=12)
+        for col in columns:
+            self.trends_tree.heading(col, text=col)
+            self.trends_tree.column(col, width=110)
+        series_scrollbar = ttk.Scrollbar(series_frame, orient=tk.VERTICAL, 
+                                         command=self.trends_tree.yview)
+        self.trends_tree.configure(yscrollcommand=series_scrollbar.set)
+        self.trends_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        series_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        # Latest month per category
+        columns = ('Category', 'Total', 'Average (3)', 'Change', 'Change %')
+        self.trends_category_frame = ttk.LabelFrame(trends_frame, text="Latest month", padding="5")
+        self.trends_category_frame.pack(fill=tk.X, pady=(10, 0))
+        self.trends_category_tree = ttk.Treeview(self.trends_category_frame, columns=columns, 
+                                                 show='headings', height=6)
+        for col in columns:
+            self.trends_category_tree.heading(col, text=col)
+            self.trends_category_tree.column(col, width=110)
+        self.trends_category_tree.pack(fill=tk.X)
+        
+        self.forecast_label = ttk.Label(trends_frame, text="", font=('Arial', 11, 'bold'))
+        self.forecast_label.pack(pady=10)
+    
+    def update_trends(self):
+        """Compute trends for the current filter on the database worker"""
+        filter_range = self.list_filter
+        category = self.category_filter
+        period = self.trends_period_var.get()
+        label = describe_filter(filter_range, category)
+        title_suffix = f" for {label}" if label else ""
+        
+        def fetch(store, job):
+            return store.trends(filter_range, category, period)
+        
+        def on_done(report):
+            if self.trends_window:
+                self.trends_window.title(f"Spending Trends{title_suffix}")
+                self.display_trends(report)
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Trend analysis failed: {str(e)}")
+        
+        self.readers.submit(fetch, on_done, on_error)
+    
+    def display_trends(self, report):
+        """Fill the trends window from an analytics report"""
+        def figure(value, spec='.2f'):
+            return '' if math.isnan(value) else format(value, spec)
+        
+        self.trends_tree.delete(*self.trends_tree.get_children())
+        for row in zip(report['labels'], report['totals'], report['average'], 
+                       report['change'], report['percent']):
+            label, total, average, change, percent = row
+            self.trends_tree.insert('', 'end', values=(
+                label, f"Rs:{total:.2f}", figure(average), figure(change), figure(percent, '.1f')
+            ))
+        children = self.trends_tree.get_children()
+        if children:
+            self.trends_tree.see(children[-1])
+        
+        self.trends_category_tree.delete(*self.trends_category_tree.get_children())
+        for row in report['categories']:
+            self.trends_category_tree.insert('', 'end', values=(
+                row['category'], f"Rs:{row['total']:.2f}", figure(row['average']), 
+                figure(row['change']), figure(row['percent'], '.1f')
+            ))
+        self.trends_category_frame.config(text=f"Latest month ({report['month'] or 'none'})")
+        
+        if report['forecast_month']:
+            self.forecast_label.config(text=f"Forecast for {report['forecast_month']}: "
+                                            f"Rs:{report['forecast']:.2f} ({report['forecast_method']})")
+        else:
+            self.forecast_label.config(text="No data available for a forecast")
+    
+    def close_trends_window(self):
+        """Destroy the trends window"""
+        self.trends_window.destroy()
+        self.trends_window = None
+    
+    def materialize_recurring(self, refresh=True):
+        """Add recurring expenses due up to today on the database worker"""
+        def materialize(store, job):
+            return store.materialize_recurring()
+        
+        def on_done(count):
+            if not refresh:
+                return
+            if count:
+                self.refresh_expense_list(self.list_filter, self.category_filter)
+            if self.recurring_window:
+                self.load_recurring_rules()
+            messagebox.showinfo("Recurring Expenses", f"Added {count} recurring expenses")
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Adding recurring expenses failed: {str(e)}")
+        
+        self.db.submit(materialize, on_done, on_error)
+    
+    def show_recurring(self):
+        """Open the recurring expense rules window, or bring it forward"""
+        if self.recurring_window:
+            self.recurring_window.lift()
+        else:
+            self.create_recurring_window()
+        self.load_recurring_rules()
+    
+    def create_recurring_window(self):
+        """Create the window listing recurring rules with a form to add one"""
+        self.recurring_window = tk.Toplevel(self.root)
+        self.recurring_window.title("Recurring Expenses")
+        self.recurring_window.geometry("900x500")
+        self.recurring_window.transient(self.root)
+        self.recurring_window.protocol("WM_DELETE_WINDOW", self.close_recurring_window)
+        
+        recurring_frame = ttk.Frame(self.recurring_window, padding="10")
+        recurring_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Rules list
+        columns = ('ID', 'Amount', 'Category', 'Description', 'Frequency', 'Start', 'End', 
+                   'Added Through')
+        self.recurring_tree = ttk.Treeview(recurring_frame, columns=columns, show='headings', 
+                                           height=10)
+        for col in columns:
+            self.recurring_tree.heading(col, text=col)
+            self.recurring_tree.column(col, width=50 if col == 'ID' else 100)
+        self.recurring_tree.pack(fill=tk.BOTH, expand=True)
+        
+        # New rule form
+        form = ttk.LabelFrame(recurring_frame, text="New Recurring Expense", padding="10")
+        form.pack(fill=tk.X, pady=10)
+        
+        self.recurring_amount_var = tk.StringVar()
+        self.recurring_category_var = tk.StringVar()
+        self.recurring_description_var = tk.StringVar()
+        self.recurring_frequency_var = tk.StringVar(value="monthly")
+        self.recurring_start_var = tk.StringVar(value=date.today().strftime("%Y-%m-%d"))
+        self.recurring_end_var = tk.StringVar()
+        
+        ttk.Label(form, text="Amount (Rs):").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Entry(form, textvariable=self.recurring_amount_var, width=15).grid(
+            row=0, column=1, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Category:").grid(row=0, column=2, sticky=tk.W, padx=(10, 0), pady=2)
+        ttk.Combobox(form, textvariable=self.recurring_category_var, values=self.categories, 
+                     width=15).grid(row=0, column=3, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Description:").grid(row=0, column=4, sticky=tk.W, padx=(10, 0), pady=2)
+        ttk.Entry(form, textvariable=self.recurring_description_var, width=20).grid(
+            row=0, column=5, sticky=(tk.W, tk.E), pady=2)
+        
+        ttk.Label(form, text="Frequency:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(form, textvariable=self.recurring_frequency_var, values=RECURRING_FREQUENCIES, 
+                     width=12, state='readonly').grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Start:").grid(row=1, column=2, sticky=tk.W, padx=(10, 0), pady=2)
+        ttk.Entry(form, textvariable=self.recurring_start_var, width=15).grid(
+            row=1, column=3, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="End (optional):").grid(row=1, column=4, sticky=tk.W, padx=(10, 0), pady=2)
+        ttk.Entry(form, textvariable=self.recurring_end_var, width=20).grid(
+            row=1, column=5, sticky=(tk.W, tk.E), pady=2)
+        
+        # Buttons
+        button_frame = ttk.Frame(recurring_frame)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="Add Rule", command=self.add_recurring_rule).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Delete Selected Rule", command=self.delete_recurring_rule).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Add Due Expenses Now", command=self.materialize_recurring).pack(
+            side=tk.RIGHT, padx=5)
+    
+    def load_recurring_rules(self):
+        """Reload the recurring rules list"""
+        def fetch(store, job):
+            return store.get_recurring_rules()
+        
+        def on_done(rules):
+            if not self.recurring_window:
+                return
+            self.recurring_tree.delete(*self.recurring_tree.get_children())
+            for rule in rules:
+                rule_id, amount, category, description, frequency, start, end, through = rule
+                self.recurring_tree.insert('', 'end', iid=str(rule_id), values=(
+                    rule_id, f"Rs:{format_amount(amount)}", category, description or '', 
+                    frequency, start, end or '', through or ''
+                ))
+        
+        self.db.submit(fetch, on_done)
+    
+    def add_recurring_rule(self):
+        """Save a new recurring rule and add any occurrences already due"""
+        try:
+            amount = parse_amount(self.recurring_amount_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid amount")
+            return
+        category = self.recurring_category_var.get().strip()
+        description = self.recurring_description_var.get().strip()
+        frequency = self.recurring_frequency_var.get()
+        start_date = self.recurring_start_var.get().strip()
+        end_date = self.recurring_end_var.get().strip() or None
+        
+        def add(store, job):
+            store.add_recurring_rule(amount, category, description, frequency, start_date, end_date)
+            return store.materialize_recurring()
+        
+        def on_done(count):
+            self.recurring_amount_var.set("")
+            self.recurring_description_var.set("")
+            self.recurring_end_var.set("")
+            self.load_recurring_rules()
+            if category not in self.categories:
+                self.load_categories()
+            if count:
+                self.refresh_expense_list(self.list_filter, self.category_filter)
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Could not add recurring expense: {str(e)}")
+        
+        self.db.submit(add, on_done, on_error)
+    
+    def delete_recurring_rule(self):
+        """Delete the selected rule; expenses it already added are kept"""
+        selected = self.recurring_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a rule to delete")
+            return
+        if not messagebox.askyesno("Confirm", "Stop this recurring expense? "
+                                   "Expenses it already added are kept."):
+            return
+        rule_id = int(selected[0])
+        
+        def delete(store, job):
+            store.delete_recurring_rule(rule_id)
+        
+        self.db.submit(delete, lambda result: self.load_recurring_rules())
+    
+    def close_recurring_window(self):
+        """Destroy the recurring rules window"""
+        self.recurring_window.destroy()
+        self.recurring_window = None
+    
+    def show_budgets(self):
+        """Open the monthly budgets window, or bring it forward"""
+        if self.budget_window:
+            self.budget_window.lift()
+        else:
+            self.create_budget_window()
+        self.display_budgets()
+    
+    def create_budget_window(self):
+        """Create the window listing budgets with a form to set one"""
+        self.budget_window = tk.Toplevel(self.root)
+        self.budget_window.title("Monthly Budgets")
+        self.budget_window.geometry("600x400")
+        self.budget_window.transient(self.root)
+        self.budget_window.protocol("WM_DELETE_WINDOW", self.close_budget_window)
+        
+        budget_frame = ttk.Frame(self.budget_window, padding="10")
+        budget_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Budgets list
+        columns = ('Category', 'Budget', 'Spent', 'Used')
+        self.budget_tree = ttk.Treeview(budget_frame, columns=columns, show='headings', height=10)
+        for col in columns:
+            self.budget_tree.heading(col, text=col)
+            self.budget_tree.column(col, width=120)
+        self.budget_tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Budget form
+        form = ttk.LabelFrame(budget_frame, text="Set Monthly Budget", padding="10")
+        form.pack(fill=tk.X, pady=10)
+        
+        self.budget_category_var = tk.StringVar()
+        self.budget_amount_var = tk.StringVar()
+        
+        ttk.Label(form, text="Category:").grid(row=0, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(form, textvariable=self.budget_category_var, values=self.categories, 
+                     width=15).grid(row=0, column=1, sticky=(tk.W, tk.E), pady=2)
+        ttk.Label(form, text="Amount (Rs):").grid(row=0, column=2, sticky=tk.W, padx=(10, 0), pady=2)
+        ttk.Entry(form, textvariable=self.budget_amount_var, width=15).grid(
+            row=0, column=3, sticky=(tk.W, tk.E), pady=2)
+        
+        # Buttons
+        button_frame = ttk.Frame(budget_frame)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text="Set Budget", command=self.set_budget).pack(
+            side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Remove Selected Budget", command=self.remove_budget).pack(
+            side=tk.LEFT, padx=5)
+    
+    def display_budgets(self):
+        """Fill the budgets window from the budgets loaded for budget_month"""
+        self.budget_window.title(f"Monthly Budgets - {self.budget_month}")
+        self.budget_tree.delete(*self.budget_tree.get_children())
+        for category, (spent, budget) in sorted(self.budgets.items()):
+            self.budget_tree.insert('', 'end', iid=category, values=(
+                category, f"Rs:{format_amount(budget)}", f"Rs:{format_amount(spent)}", 
+                f"{spent * 100 // budget}%"
+            ))
+    
+    def set_budget(self):
+        """Save the monthly budget entered for a category"""
+        try:
+            amount = parse_amount(self.budget_amount_var.get())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid amount")
+            return
+        category = self.budget_category_var.get().strip()
+        
+        def save(store, job):
+            store.set_budget(category, amount)
+        
+        def on_done(result):
+            self.budget_amount_var.set("")
+            if category not in self.categories:
+                self.load_categories()
+            self.load_budgets()
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Could not set budget: {str(e)}")
+        
+        self.db.submit(save, on_done, on_error)
+    
+    def remove_budget(self):
+        """Remove the budget of the selected category"""
+        selected = self.budget_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a budget to remove")
+            return
+        category = selected[0]
+        
+        def remove(store, job):
+            store.set_budget(category, None)
+        
+        self.db.submit(remove, lambda result: self.load_budgets())
+    
+    def close_budget_window(self):
+        """Destroy the budgets window"""
+        self.budget_window.destroy()
+        self.budget_window = None
+    
+    def show_stats(self):
+        """Open the performance stats window, or bring it forward"""
+        if self.stats_window:
+            self.stats_window.lift()
+        else:
+            self.create_stats_window()
+        self.update_stats()
+    
+    def create_stats_window(self):
+        """Create the window listing timings by kind and operation"""
+        self.stats_window = tk.Toplevel(self.root)
+        self.stats_window.title("Performance Stats")
+        self.stats_window.geometry("1000x500")
+        self.stats_window.transient(self.root)
+        self.stats_window.protocol("WM_DELETE_WINDOW", self.close_stats_window)
+        
+        stats_frame = ttk.Frame(self.stats_window, padding="10")
+        stats_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ('Kind', 'Operation', 'Count', 'Total ms', 'Avg ms', 'Max ms', 'Rows')
+        self.stats_tree = ttk.Treeview(stats_frame, columns=columns, show='headings', height=18)
+        for col in columns:
+            self.stats_tree.heading(col, text=col)
+            self.stats_tree.column(col, width=500 if col == 'Operation' else 70, 
+                                   anchor=tk.W if col in ('Kind', 'Operation') else tk.E)
+        stats_scrollbar = ttk.Scrollbar(stats_frame, orient=tk.VERTICAL, 
+                                        command=self.stats_tree.yview)
+        self.stats_tree.configure(yscrollcommand=stats_scrollbar.set)
+        stats_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.stats_tree.pack(fill=tk.BOTH, expand=True)
+        
+        button_frame = ttk.Frame(self.stats_window, padding=(10, 0, 10, 10))
+        button_frame.pack(fill=tk.X)
+        ttk.Label(button_frame, text=f"Log: {os.path.abspath(self.perf_log)}", 
+                  foreground='gray').pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Reset", command=self.reset_stats).pack(side=tk.RIGHT, padx=5)
+    
+    def update_stats(self):
+        """Refresh the stats window, then again every STATS_REFRESH_MS while it is open"""
+        if self.stats_refresh:
+            self.root.after_cancel(self.stats_refresh)
+        self.stats_tree.delete(*self.stats_tree.get_children())
+        for kind, label, count, total, longest, rows in self.perf_stats.snapshot():
+            self.stats_tree.insert('', 'end', values=(
+                kind, label, count, f"{total * 1000:.1f}", f"{total * 1000 / count:.2f}", 
+                f"{longest * 1000:.1f}", rows
+            ))
+        self.stats_refresh = self.root.after(STATS_REFRESH_MS, self.update_stats)
+    
+    def reset_stats(self):
+        """Forget the timings collected so far"""
+        self.perf_stats.reset()
+        self.update_stats()
+    
+    def close_stats_window(self):
+        """Stop refreshing and destroy the stats window"""
+        if self.stats_refresh:
+            self.root.after_cancel(self.stats_refresh)
+            self.stats_refresh = None
+        self.stats_window.destroy()
+        self.stats_window = None
+    
+    def toggle_sql_trace(self):
+        """Start or stop logging every statement SQLite runs, with its values
+        
+        The writer and every reader pick the setting up before their next job,
+        including on connections opened later, e.g. for another ledger.
+        """
+        self.trace_sql = self.trace_sql_var.get()
+    
+    def apply_sql_trace(self, store):
+        """Match a store's trace callback to the Debug menu (on its worker thread)"""
+        trace = self.trace_sql
+        if getattr(store, 'traced', False) != trace:
+            from instrumentation import trace_statement
+            store.conn.set_trace_callback(trace_statement if trace else None)
+            store.traced = trace
+    
+    def toggle_profiling(self):
+        """Start cProfile on the Tk and database threads, or stop it and save
+        the combined profile next to the log
+        """
+        import instrumentation
+        if self.profiling_var.get():
+            # A profile only covers the thread that enabled it, so the writer
+            # and every reader thread start, and later stop, their own
+            worker_profiles = {}
+            self.profiles = (instrumentation.start_profile(), worker_profiles)
+            
+            def start(store, job):
+                worker_profiles[threading.get_ident()] = instrumentation.start_profile()
+            
+            self.db.submit_each(start)
+            self.readers.submit_each(start)
+            return
+        
+        tk_profile, worker_profiles = self.profiles
+        self.profiles = None
+        tk_profile.disable()
+        
+        def stop(store, job):
+            profile = worker_profiles.get(threading.get_ident())
+            if profile:
+                profile.disable()
+        
+        def on_done(results):
+            profiles = [tk_profile, *worker_profiles.values()]
+            path = os.path.splitext(self.perf_log)[0] + '.prof'
+            instrumentation.save_profile(profiles, path)
+            instrumentation.logger.info("cProfile report:\n%s", 
+                                        instrumentation.profile_report(profiles))
+            messagebox.showinfo("Profile", f"Profile saved to {path}; the slowest functions "
+                                f"are listed in {self.perf_log}")
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Saving the profile failed: {str(e)}")
+        
+        self.db.submit_each(stop, lambda results: self.readers.submit_each(stop, on_done, on_error), 
+                            on_error)
+    
     def backup_data(self):
         """Backup database to JSON file"""
         try:
             filename = filedialog.asksaveasfilename(
                 defaultextension=".json",
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+                filetypes=BACKUP_FILETYPES,
                 title="Save backup as JSON"
             )
             
             if filename:
-                # Get all expenses
-                self.cursor.execute('SELECT * FROM expenses ORDER BY id')
-                expenses = self.cursor.fetchall()
+                def backup(store, job):
+                    # Row count for progress comes from the rollup
+                    total_rows = store.count() or 1
+                    
+                    with open(filename, 'wb') as raw, open_backup(raw, filename, 'w') as f:
+                        steps = store.backup(f, ndjson=is_ndjson(filename))
+                        return job.run_steps(steps, lambda count: count / total_rows)
                 
-                # Convert to dict format
-                backup_data = {
-                    'expenses': [
-                        {
-                            'id': exp[0],
-                            'amount': exp[1],
-                            'category': exp[2],
-                            'description': exp[3],
-                            'date': exp[4],
-                            'created_at': exp[5]
-                        } for exp in expenses
-                    ],
-                    'backup_date': datetime.now().isoformat(),
-                    'total_records': len(expenses)
-                }
+                def on_done(count):
+                    messagebox.showinfo("Success", f"Backup of {count} records saved to {filename}")
                 
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, indent=2, ensure_ascii=False)
+                def on_cancel():
+                    if os.path.exists(filename):
+                        os.remove(filename)
                 
-                messagebox.showinfo("Success", f"Backup saved to {filename}")
+                self.run_long_job("Backing up", backup, on_done, "Backup failed", on_cancel, 
+                                  readonly=True)
         
         except Exception as e:
             messagebox.showerror("Error", f"Backup failed: {str(e)}")
@@ -534,7 +1994,7 @@ class PersonalExpenseTracker:
         """Restore database from JSON backup"""
         try:
             filename = filedialog.askopenfilename(
-                filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+                filetypes=BACKUP_FILETYPES,
                 title="Select backup file to restore"
             )
             
@@ -542,41 +2002,153 @@ class PersonalExpenseTracker:
                 if messagebox.askyesno("Confirm", 
                     "This will replace all current data. Are you sure?"):
                     
-                    with open(filename, 'r', encoding='utf-8') as f:
-                        backup_data = json.load(f)
+                    def restore(store, job):
+                        # Progress follows the position in the (possibly compressed) file
+                        size = os.path.getsize(filename) or 1
+                        
+                        with open(filename, 'rb') as raw, open_backup(raw, filename, 'r') as f:
+                            steps = store.restore(f, ndjson=is_ndjson(filename))
+                            return job.run_steps(steps, lambda count: raw.tell() / size)
                     
-                    # Clear existing data
-                    self.cursor.execute('DELETE FROM expenses')
+                    def on_done(count):
+                        self.refresh_expense_list(self.list_filter, self.category_filter)
+                        self.load_categories()
+                        messagebox.showinfo("Success", f"Restored {count} records")
                     
-                    # Restore expenses
-                    for exp in backup_data['expenses']:
-                        self.cursor.execute('''
-                            INSERT INTO expenses (amount, category, description, date)
-                            VALUES (?, ?, ?, ?)
-                        ''', (exp['amount'], exp['category'], 
-                             exp['description'], exp['date']))
-                    
-                    self.conn.commit()
-                    self.refresh_expense_list()
-                    
-                    messagebox.showinfo("Success", 
-                        f"Restored {len(backup_data['expenses'])} records")
+                    self.run_long_job("Restoring", restore, on_done, "Restore failed")
         
         except Exception as e:
             messagebox.showerror("Error", f"Restore failed: {str(e)}")
     
-    def __del__(self):
-        """Close database connection"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+    def save_snapshot(self):
+        """Save a full copy of the database and start a new incremental backup chain"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".db",
+            filetypes=SNAPSHOT_FILETYPES,
+            title="Save full snapshot as"
+        )
+        if not filename:
+            return
+        
+        def snapshot(store, job):
+            def progress(copied, total):
+                job.check_cancelled()
+                job.report(copied, copied / total)
+            
+            store.snapshot(filename, progress)
+            return os.path.getsize(filename)
+        
+        def on_done(size):
+            messagebox.showinfo("Success", f"Snapshot of {size / (1 << 20):.1f} MB saved to "
+                                f"{filename}. Incremental backups now follow this snapshot.")
+        
+        # Runs on the writer: recording the checkpoint needs the write lock
+        self.run_long_job("Saving snapshot", snapshot, on_done, "Snapshot failed", unit="pages")
+    
+    def save_incremental_backup(self):
+        """Save the changes since the last snapshot or incremental backup"""
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".ndjson.gz",
+            initialfile=f"incremental-{datetime.now():%Y%m%d-%H%M%S}.ndjson.gz",
+            filetypes=INCREMENTAL_FILETYPES,
+            title="Save incremental backup as"
+        )
+        if not filename:
+            return
+        
+        def backup(store, job):
+            return job.run_steps(store.incremental_backup(filename))
+        
+        def on_done(count):
+            messagebox.showinfo("Success", f"Incremental backup of {count} added or changed "
+                                f"records saved to {filename}")
+        
+        self.run_long_job("Backing up changes", backup, on_done, "Incremental backup failed")
+    
+    def restore_snapshot(self):
+        """Replace the database with a snapshot and the incremental backups after it"""
+        snapshot_file = filedialog.askopenfilename(
+            filetypes=SNAPSHOT_FILETYPES,
+            title="Select snapshot to restore"
+        )
+        if not snapshot_file:
+            return
+        incrementals = filedialog.askopenfilenames(
+            filetypes=INCREMENTAL_FILETYPES,
+            title="Select incremental backups to replay (cancel for none)"
+        )
+        if not messagebox.askyesno("Confirm", 
+            "This will replace all current data. Are you sure?"):
+            return
+        
+        def restore(store, job):
+            return job.run_steps(store.restore_snapshot(snapshot_file, list(incrementals)))
+        
+        def on_done(count):
+            if self.edit_window:
+                self.close_edit_window()
+            self.refresh_expense_list(self.list_filter, self.category_filter)
+            self.load_categories()
+            if self.recurring_window:
+                self.load_recurring_rules()
+            if self.trends_window:
+                self.update_trends()
+            messagebox.showinfo("Success", f"Restored the snapshot and {len(incrementals)} "
+                                f"incremental backups ({count} records replayed)")
+        
+        self.run_long_job("Restoring snapshot", restore, on_done, "Restore failed")
+    
+    def close(self):
+        """Cancel any background job and close the database connection"""
+        if self.long_job:
+            self.long_job.cancel()
+        if self.chart_view:
+            self.chart_view.close()
+        if self.trends_window:
+            self.close_trends_window()
+        if self.recurring_window:
+            self.close_recurring_window()
+        if self.budget_window:
+            self.close_budget_window()
+        if self.stats_window:
+            self.close_stats_window()
+        if self.edit_window:
+            self.close_edit_window()
+        self.readers.shutdown()
+        self.db.shutdown()
 
 def main():
+    parser = argparse.ArgumentParser(description="Personal Expense Tracker")
+    parser.add_argument('--timing', action='store_true', 
+                        help="print how long each startup phase takes")
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER, 
+                        help=f"ledger to open (default: {DEFAULT_LEDGER})")
+    parser.add_argument('--instrument', action='store_true', 
+                        help="time every SQL statement, database job and UI callback, "
+                             "log them and add a Debug menu")
+    parser.add_argument('--perf-log', default='expense-tracker-perf.log', metavar='PATH', 
+                        help="rotating log written with --instrument "
+                             "(default: expense-tracker-perf.log)")
+    parser.add_argument('--pragma', action='append', default=[], metavar='NAME=VALUE', 
+                        help="override a SQLite setting, e.g. synchronous=FULL "
+                             f"({', '.join(DEFAULT_PRAGMAS)})")
+    args = parser.parse_args()
+    timer = StartupTimer() if args.timing or os.environ.get('EXPENSE_TRACKER_TIMING') else None
+    instrument = args.instrument or os.environ.get('EXPENSE_TRACKER_INSTRUMENT')
+    try:
+        pragmas = parse_pragmas(args.pragma)
+        ledger_path(args.ledger)
+    except ValueError as e:
+        parser.error(str(e))
+    args.ledger = find_ledger(args.ledger)
+    
     root = tk.Tk()
-    app = PersonalExpenseTracker(root)
+    app = PersonalExpenseTracker(root, timer, pragmas, args.perf_log if instrument else None, 
+                                 args.ledger)
     
     # Handle window closing
     def on_closing():
-        app.conn.close()
+        app.close()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -0,0 +1,119 @@
+"""Benchmark month filtering with LIKE versus indexed half-open date ranges.
+
+Builds a throwaway database with synthetic expenses, prints the SQLite
+query plan for each variant and times it:
+
+    python benchmarks/bench_date_filter.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from expense_store import EXPENSE_INDEXES, month_range
+
+CATEGORIES = ['Food', 'Transportation', 'Entertainment', 'Shopping',
+              'Bills', 'Healthcare', 'Education', 'Others']
+
+def build_database(path, rows, seed=42):
+    """Create the expenses table and fill it with random rows over ten years"""
+    rng = random.Random(seed)
+    first_day = date(2015, 1, 1)
+    span = (date(2025, 1, 1) - first_day).days
+    
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            date TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    batch = []
+    for _ in range(rows):
+        day = first_day + timedelta(days=rng.randrange(span))
+        batch.append((rng.randint(1000, 500000), rng.choice(CATEGORIES),
+                      'synthetic', day.isoformat()))
+        if len(batch) == 50000:
+            conn.executemany('INSERT INTO expenses (amount, category, description, date) '
+                             'VALUES (?, ?, ?, ?)', batch)
+            batch.clear()
+    if batch:
+        conn.executemany('INSERT INTO expenses (amount, category, description, date) '
+                         'VALUES (?, ?, ?, ?)', batch)
+    conn.commit()
+    return conn
+
+def create_indexes(conn):
+    """Create the same indexes as the expense store"""
+    for index_sql in EXPENSE_INDEXES.values():
+        conn.execute(index_sql)
+    conn.execute('ANALYZE')
+    conn.commit()
+
+def time_query(conn, sql, params, repeat):
+    """Return the best wall time in milliseconds over several runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def report(conn, label, sql, params, repeat):
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    elapsed = time_query(conn, sql, params, repeat)
+    print(f"{label}: {elapsed:.2f} ms")
+    for row in plan:
+        print(f"    {row[-1]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--month', default='2020-06')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    start, end = month_range(args.month)
+    like_page = ('SELECT id, date, category, description, amount FROM expenses '
+                 'WHERE date LIKE ? ORDER BY date DESC, id DESC LIMIT 100')
+    range_page = ('SELECT id, date, category, description, amount FROM expenses '
+                  'WHERE date >= ? AND date < ? ORDER BY date DESC, id DESC LIMIT 100')
+    like_total = 'SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE date LIKE ?'
+    range_total = 'SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE date >= ? AND date < ?'
+    like_chart = ('SELECT category, SUM(amount) FROM expenses WHERE date LIKE ? '
+                  'GROUP BY category ORDER BY SUM(amount) DESC')
+    range_chart = ('SELECT category, SUM(amount) FROM expenses WHERE date >= ? AND date < ? '
+                   'GROUP BY category ORDER BY SUM(amount) DESC')
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        conn = build_database(os.path.join(tmp, 'bench.db'), args.rows)
+        print(f"Generated {args.rows} rows in {time.perf_counter() - started:.1f} s\n")
+        
+        print("== Without indexes ==")
+        report(conn, "LIKE page", like_page, (f"{args.month}%",), args.repeat)
+        report(conn, "LIKE total", like_total, (f"{args.month}%",), args.repeat)
+        report(conn, "LIKE chart", like_chart, (f"{args.month}%",), args.repeat)
+        
+        create_indexes(conn)
+        print("\n== With indexes ==")
+        report(conn, "LIKE page", like_page, (f"{args.month}%",), args.repeat)
+        report(conn, "Range page", range_page, (start, end), args.repeat)
+        report(conn, "LIKE total", like_total, (f"{args.month}%",), args.repeat)
+        report(conn, "Range total", range_total, (start, end), args.repeat)
+        report(conn, "LIKE chart", like_chart, (f"{args.month}%",), args.repeat)
+        report(conn, "Range chart", range_chart, (start, end), args.repeat)
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Benchmark the expense store operations behind the app's main actions.
+
+Builds synthetic databases of each requested size (see synthetic_data.py),
+times every operation headlessly through ExpenseStore and writes the
+results as JSON. Comparing against an earlier results file reports
+operations that got slower and exits with status 1:
+
+    python benchmarks/bench_store.py --rows 10000 100000 --output results.json
+    python benchmarks/bench_store.py --rows 10000 100000 --baseline results.json
+
+Generated databases are rebuilt for every run unless --cache names a
+directory to keep them in, which is worthwhile for millions of rows. Each
+run works on a copy, so cached databases stay as they were generated.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from expense_store import ExpenseStore, month_range, date_range, parse_pragmas
+from synthetic_data import DATASET_VERSION, build_dataset
+
+# Version of the results file layout
+RESULTS_VERSION = 1
+
+# Filters used by the filtered operations; they fall inside the generated data
+BENCH_MONTH = '2020-06'
+BENCH_RANGE = ('2019-03-15', '2021-07-10')
+
+# Operations in the order they run; restore_data reads the file backup_data writes
+OPERATIONS = ['refresh_expense_list', 'load_next_page', 'month_filter', 'category_month_filter', 
+              'chart_all', 'chart_month', 'chart_date_range', 'search', 'bulk_edit', 
+              'export_to_csv', 'backup_data', 'restore_data', 'save_snapshot']
+BULK_OPERATIONS = {'export_to_csv', 'backup_data', 'restore_data', 'save_snapshot'}
+
+def time_operation(operation, repeat):
+    """Run operation repeat times and return the wall times in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def exhaust(progress):
+    """Run a store generator to completion and return its last progress count"""
+    count = 0
+    for count in progress:
+        pass
+    return count
+
+def store_operations(store, tmp):
+    """Return a function for each name in OPERATIONS
+    
+    Names follow the app methods whose database work they repeat. Bulk
+    operations read or write every expense.
+    """
+    month = month_range(BENCH_MONTH)
+    span = date_range(*BENCH_RANGE)
+    csv_path = os.path.join(tmp, 'export.csv')
+    backup_path = os.path.join(tmp, 'backup.json')
+    snapshot_path = os.path.join(tmp, 'snapshot.db')
+    
+    def refresh_expense_list():
+        page = store.fetch_page()
+        store.total()
+        return page
+    
+    def load_next_page():
+        # Tenth page of the unfiltered list
+        after = None
+        for _ in range(10):
+            page = store.fetch_page(after=after)
+            after = (page[-1][1], page[-1][0])
+    
+    def month_filter():
+        store.fetch_page(month)
+        store.total(month)
+    
+    def category_month_filter():
+        store.fetch_page(month, 'Food')
+        store.total(month, 'Food')
+    
+    def bulk_edit():
+        # Recategorize a month of Food and back, leaving the data as it was
+        store.update_expenses({'category': 'Dining'}, date_range=month, category='Food')
+        store.update_expenses({'category': 'Food'}, date_range=month, category='Dining')
+    
+    def export_to_csv():
+        with open(csv_path, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+            exhaust(store.export_csv(f))
+    
+    def backup_data():
+        with open(backup_path, 'w', encoding='utf-8') as f:
+            exhaust(store.backup(f))
+    
+    def restore_data():
+        with open(backup_path, encoding='utf-8') as f:
+            exhaust(store.restore(f))
+    
+    def save_snapshot():
+        store.snapshot(snapshot_path)
+    
+    return {
+        'refresh_expense_list': refresh_expense_list,
+        'load_next_page': load_next_page,
+        'month_filter': month_filter,
+        'category_month_filter': category_month_filter,
+        'chart_all': lambda: store.category_totals(),
+        'chart_month': lambda: store.category_totals(month),
+        'chart_date_range': lambda: store.category_totals(span),
+        'search': lambda: store.search('coffee'),
+        'bulk_edit': bulk_edit,
+        'export_to_csv': export_to_csv,
+        'backup_data': backup_data,
+        'restore_data': restore_data,
+        'save_snapshot': save_snapshot,
+    }
+
+def dataset_path(directory, rows, seed):
+    """Return the path of the cached database for rows and seed"""
+    return os.path.join(directory, f'expenses-{rows}-{seed}-v{DATASET_VERSION}.db')
+
+def run_size(rows, operations, args, directory, log):
+    """Benchmark one dataset size and return its result entries"""
+    path = dataset_path(directory, rows, args.seed)
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        build_dataset(path, rows, args.seed, args.pragmas)
+        log(f"Generated {rows} rows in {time.perf_counter() - started:.1f} s")
+    
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Restores and snapshots change the database (a snapshot turns on the
+        # change log), so each run works on a fresh copy of the dataset
+        work_path = os.path.join(tmp, 'work.db')
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(work_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        with ExpenseStore(work_path, args.pragmas) as store:
+            functions = store_operations(store, tmp)
+            for name in operations:
+                bulk = name in BULK_OPERATIONS
+                samples = time_operation(functions[name], 
+                                         args.bulk_repeat if bulk else args.repeat)
+                result = {
+                    'rows': rows,
+                    'operation': name,
+                    'samples_ms': [round(sample, 3) for sample in samples],
+                    'best_ms': round(min(samples), 3),
+                    'median_ms': round(statistics.median(samples), 3),
+                }
+                if bulk:
+                    result['rows_per_second'] = round(rows / (min(samples) / 1000))
+                results.append(result)
+                log(f"{rows:>10} {name:<22} {result['median_ms']:>12.2f} ms")
+    return results
+
+def environment(pragmas):
+    """Describe the machine and library versions the results were taken on"""
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'pragmas': pragmas or {},
+    }
+
+def compare(results, baseline, tolerance, log):
+    """Log each operation's change against a baseline results file and
+    return the (rows, operation) keys that got slower than tolerance allows
+    """
+    previous = {(entry['rows'], entry['operation']): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        key = (entry['rows'], entry['operation'])
+        if key not in previous:
+            continue
+        ratio = entry['median_ms'] / max(previous[key]['median_ms'], 1e-6)
+        slower = ratio > 1 + tolerance
+        if slower:
+            regressions.append(key)
+        log(f"{entry['rows']:>10} {entry['operation']:<22} {ratio:>8.2f}x"
+            f"{'  REGRESSION' if slower else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000],
+                        help="dataset sizes to benchmark (default: 10000 100000)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="runs of each query operation (default: 5)")
+    parser.add_argument('--bulk-repeat', type=int, default=1,
+                        help="runs of export, backup and restore (default: 1)")
+    parser.add_argument('--only', nargs='+', choices=OPERATIONS, metavar='OPERATION',
+                        help=f"benchmark only these operations: {', '.join(OPERATIONS)}")
+    parser.add_argument('--cache', help="directory keeping generated databases between runs")
+    parser.add_argument('--pragma', action='append', default=[], metavar='NAME=VALUE',
+                        help="override a SQLite setting, as in cli.py")
+    parser.add_argument('--output', help="write JSON results here instead of standard output")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default: 0.25 = 25%%)")
+    args = parser.parse_args()
+    try:
+        args.pragmas = parse_pragmas(args.pragma)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+    
+    operations = [name for name in OPERATIONS if not args.only or name in args.only 
+                  or (name == 'backup_data' and 'restore_data' in args.only)]
+    
+    results = []
+    if args.cache:
+        os.makedirs(args.cache, exist_ok=True)
+        for rows in args.rows:
+            results.extend(run_size(rows, operations, args, args.cache, log))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in args.rows:
+                results.extend(run_size(rows, operations, args, tmp, log))
+    
+    report = {
+        'version': RESULTS_VERSION,
+        'dataset_version': DATASET_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'environment': environment(args.pragmas),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        log(f"\nCompared with {args.baseline}:")
+        regressions = compare(results, baseline, args.tolerance, log)
+        if regressions:
+            log(f"{len(regressions)} operations slower than the baseline allows")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
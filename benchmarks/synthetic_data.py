@@ -0,0 +1,131 @@
+"""Generate synthetic expense databases for benchmarks.
+
+Expenses are spread over ten years with more spending on weekends, in
+December and in later years, amounts follow a log-normal distribution per
+category with yearly inflation, and descriptions come from a small
+vocabulary per category. The same rows and seed always give the same data:
+
+    python benchmarks/synthetic_data.py --rows 1000000 synthetic.db
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from expense_store import ExpenseStore, format_amount, restore_expenses
+
+# Bump when the generated data changes so cached datasets are rebuilt
+DATASET_VERSION = 1
+
+FIRST_DAY = date(2015, 1, 1)
+LAST_DAY = date(2024, 12, 31)
+
+# Share of expenses, median amount in rupees, log-normal spread and descriptions
+CATEGORY_PROFILES = {
+    'Food': (0.34, 450, 0.8, ['Groceries', 'Lunch', 'Dinner', 'Coffee', 'Snacks',
+                              'Bakery', 'Fruit and vegetables', 'Takeaway']),
+    'Transportation': (0.18, 300, 0.9, ['Fuel', 'Taxi', 'Bus fare', 'Parking',
+                                        'Rickshaw', 'Train ticket']),
+    'Entertainment': (0.08, 1200, 0.9, ['Cinema', 'Streaming subscription', 'Concert',
+                                        'Games', 'Books']),
+    'Shopping': (0.12, 2500, 1.1, ['Clothes', 'Shoes', 'Electronics', 'Household items',
+                                   'Gifts']),
+    'Bills': (0.10, 4000, 0.7, ['Electricity bill', 'Gas bill', 'Internet', 'Mobile top-up',
+                                'Water bill', 'Rent']),
+    'Healthcare': (0.05, 1500, 1.0, ['Pharmacy', 'Doctor visit', 'Lab tests', 'Dental']),
+    'Education': (0.05, 3000, 1.0, ['Tuition', 'Stationery', 'Course fee', 'Textbooks']),
+    'Others': (0.08, 800, 1.2, ['Charity', 'Repairs', 'Haircut', 'Laundry', 'Miscellaneous']),
+}
+
+MERCHANTS = ['Metro', 'Imtiaz', 'Daraz', 'Careem', 'Shell', 'PSO', 'Cinepax', 'Servis',
+             'Chase Up', 'Al-Fatah', 'Hyperstar', 'Bata']
+
+# Relative amount of spending per weekday (Monday first) and per month
+WEEKDAY_WEIGHTS = [1.0, 0.95, 0.95, 1.0, 1.2, 1.4, 1.3]
+MONTH_WEIGHTS = [0.95, 0.9, 1.0, 1.0, 1.0, 0.95, 1.0, 1.05, 1.0, 1.0, 1.05, 1.3]
+
+# Yearly growth in the number of expenses and in prices
+VOLUME_GROWTH = 0.06
+INFLATION = 0.08
+
+def day_weights(first_day=FIRST_DAY, last_day=LAST_DAY):
+    """Return the relative number of expenses on each day of the range"""
+    weights = []
+    day = first_day
+    while day <= last_day:
+        years = (day - first_day).days / 365.25
+        weights.append(WEEKDAY_WEIGHTS[day.weekday()] * MONTH_WEIGHTS[day.month - 1]
+                       * (1 + VOLUME_GROWTH) ** years)
+        day += timedelta(days=1)
+    return weights
+
+def generate_expenses(rows, seed=42, first_day=FIRST_DAY, last_day=LAST_DAY):
+    """Yield rows backup records in date order, as restore_expenses expects
+    
+    Each day gets its share of rows from day_weights, so the records are
+    streamed without holding or sorting them in memory.
+    """
+    rng = random.Random(seed)
+    names = list(CATEGORY_PROFILES)
+    cumulative = list(itertools.accumulate(profile[0] for profile in CATEGORY_PROFILES.values()))
+    weights = day_weights(first_day, last_day)
+    scale = rows / sum(weights)
+    
+    expected = 0.0
+    emitted = 0
+    for offset, weight in enumerate(weights):
+        expected += weight * scale
+        count = rows - emitted if offset == len(weights) - 1 else int(expected) - emitted
+        if count <= 0:
+            continue
+        day = first_day + timedelta(days=offset)
+        price_level = (1 + INFLATION) ** (offset / 365.25)
+        for category in rng.choices(names, cum_weights=cumulative, k=count):
+            _, median, spread, items = CATEGORY_PROFILES[category]
+            rupees = max(rng.lognormvariate(math.log(median), spread) * price_level, 10)
+            # Most amounts are whole rupees
+            paisa = round(rupees) * 100 if rng.random() < 0.8 else round(rupees * 100)
+            
+            chance = rng.random()
+            if chance < 0.05:
+                description = ''
+            elif chance < 0.5:
+                description = f"{rng.choice(items)} at {rng.choice(MERCHANTS)}"
+            else:
+                description = rng.choice(items)
+            
+            yield {'amount': format_amount(paisa), 'category': category,
+                   'description': description, 'date': day.isoformat()}
+        emitted += count
+
+def build_dataset(path, rows, seed=42, pragmas=None):
+    """Create (or replace the expenses of) the database at path with synthetic rows
+    
+    Uses the same bulk load as restoring a backup, so indexes, the rollup and
+    the search index are built once at the end.
+    """
+    with ExpenseStore(path, pragmas) as store:
+        for _ in restore_expenses(store.conn, generate_expenses(rows, seed)):
+            pass
+        store.conn.execute('ANALYZE')
+        store.conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="database to create")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    started = time.perf_counter()
+    build_dataset(args.path, args.rows, args.seed)
+    print(f"Generated {args.rows} rows in {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Persistent chart window for the expense tracker
+
+The window owns one matplotlib Figure for its whole lifetime. New data
+updates the existing pie wedges and bars in place; the axes are only
+rebuilt when the set of categories changes. The Figure is created
+directly rather than through pyplot, so it is never registered with
+pyplot's global figure manager and is freed as soon as the window is
+closed.
+"""
+import math
+import tkinter as tk
+from tkinter import ttk
+
+from matplotlib import cm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+PIE_START_ANGLE = 90
+PIE_LABEL_DISTANCE = 1.1
+PIE_PCT_DISTANCE = 0.6
+
+class ChartView:
+    """Toplevel window showing a pie and a bar chart of category totals"""
+    
+    def __init__(self, root, on_save, on_close):
+        self.on_close = on_close
+        self.categories = None
+        self.wedges = []
+        self.labels = []
+        self.autotexts = []
+        self.bars = []
+        self.bar_texts = []
+        
+        self.window = tk.Toplevel(root)
+        self.window.geometry("900x700")
+        self.window.configure(bg='white')
+        self.window.transient(root)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        chart_frame = ttk.Frame(self.window, padding="10")
+        chart_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.figure = Figure(figsize=(14, 6))
+        self.pie_ax, self.bar_ax = self.figure.subplots(1, 2)
+        
+        self.canvas = FigureCanvasTkAgg(self.figure, chart_frame)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        # Button frame
+        button_frame = ttk.Frame(chart_frame)
+        button_frame.pack(fill=tk.X, pady=10)
+        
+        close_btn = ttk.Button(button_frame, text="Close Chart", command=self.close)
+        close_btn.pack(side=tk.RIGHT, padx=5)
+        
+        export_chart_btn = ttk.Button(button_frame, text="Save Chart as PNG",
+                                     command=lambda: on_save(self.figure))
+        export_chart_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # Center the window
+        self.window.update_idletasks()
+        x = (self.window.winfo_screenwidth() // 2) - (self.window.winfo_width() // 2)
+        y = (self.window.winfo_screenheight() // 2) - (self.window.winfo_height() // 2)
+        self.window.geometry(f"+{x}+{y}")
+    
+    def update(self, data, title_suffix):
+        """Show (category, amount) rows, reusing the existing artists when possible"""
+        self.window.title(f"Expense Chart{title_suffix}")
+        
+        amounts_by_category = dict(data)
+        if self.categories is not None and set(self.categories) == set(amounts_by_category):
+            # Same categories: keep their order so every artist can be reused
+            amounts = [amounts_by_category[c] for c in self.categories]
+            self.update_artists(amounts)
+        else:
+            self.categories = [row[0] for row in data]
+            amounts = [row[1] for row in data]
+            self.build_artists(amounts)
+        
+        self.pie_ax.set_title(f'Expense Distribution{title_suffix}',
+                              fontsize=12, fontweight='bold')
+        self.bar_ax.set_title(f'Expense Amounts by Category{title_suffix}',
+                              fontsize=12, fontweight='bold')
+        self.canvas.draw_idle()
+    
+    def build_artists(self, amounts):
+        """Recreate both charts for a new set of categories"""
+        self.pie_ax.clear()
+        self.bar_ax.clear()
+        
+        if not self.categories:
+            self.wedges, self.labels, self.autotexts = [], [], []
+            self.bars, self.bar_texts = [], []
+            self.pie_ax.axis('off')
+            self.pie_ax.text(0.5, 0.5, "No data available", ha='center', va='center',
+                             transform=self.pie_ax.transAxes)
+            return
+        
+        # Pie chart
+        self.wedges, self.labels, self.autotexts = self.pie_ax.pie(
+            amounts, labels=self.categories, autopct='%1.1f%%',
+            startangle=PIE_START_ANGLE, labeldistance=PIE_LABEL_DISTANCE,
+            pctdistance=PIE_PCT_DISTANCE)
+        
+        # Bar chart
+        self.bars = list(self.bar_ax.bar(self.categories, amounts,
+                                         color=cm.Set3(range(len(self.categories)))))
+        self.bar_ax.set_xlabel('Category')
+        self.bar_ax.set_ylabel('Amount (Rs)')
+        self.bar_ax.tick_params(axis='x', rotation=45)
+        
+        # Value labels on bars are positioned by update_bar_texts
+        self.bar_texts = [self.bar_ax.text(bar.get_x() + bar.get_width()/2., 0, '',
+                                           ha='center', va='bottom', fontsize=9)
+                          for bar in self.bars]
+        self.update_bar_texts(amounts)
+        
+        self.figure.tight_layout()
+    
+    def update_artists(self, amounts):
+        """Move the existing wedges, labels and bars to new amounts"""
+        if not self.categories:
+            return
+        
+        # Same geometry as Axes.pie: counter-clockwise from the start angle
+        total = sum(amounts)
+        theta = PIE_START_ANGLE
+        for wedge, label, autotext, amount in zip(self.wedges, self.labels,
+                                                  self.autotexts, amounts):
+            fraction = amount / total if total else 0
+            end = theta + 360 * fraction
+            wedge.set_theta1(theta)
+            wedge.set_theta2(end)
+            
+            middle = math.radians((theta + end) / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            label.set_position((PIE_LABEL_DISTANCE * x, PIE_LABEL_DISTANCE * y))
+            label.set_horizontalalignment('left' if x > 0 else 'right')
+            autotext.set_position((PIE_PCT_DISTANCE * x, PIE_PCT_DISTANCE * y))
+            autotext.set_text(f'{fraction * 100:.1f}%')
+            theta = end
+        
+        for bar, amount in zip(self.bars, amounts):
+            bar.set_height(amount)
+        self.update_bar_texts(amounts)
+        
+        self.bar_ax.relim()
+        self.bar_ax.autoscale_view()
+    
+    def update_bar_texts(self, amounts):
+        """Place the value label above each bar"""
+        offset = max(amounts) * 0.01
+        for bar, text, amount in zip(self.bars, self.bar_texts, amounts):
+            text.set_y(amount + offset)
+            text.set_text(f'Rs:{amount:.2f}')
+    
+    def lift(self):
+        """Bring the window to the front"""
+        self.window.deiconify()
+        self.window.lift()
+    
+    def close(self):
+        """Destroy the window and release the figure"""
+        self.figure.clear()
+        self.canvas.get_tk_widget().destroy()
+        self.window.destroy()
+        self.figure = None
+        self.canvas = None
+        self.on_close()
@@ -0,0 +1,405 @@
+"""Command-line interface to the expense store.
+
+Runs without Tk or matplotlib, so it works on headless servers:
+
+    python cli.py add 250 Food --description "Lunch" --date 2025-06-19
+    python cli.py query --month 2025-06 --category Food
+    python cli.py search "coffee beans" --from 2025-01-01
+    python cli.py totals --from 2025-01-01 --to 2025-03-31
+    python cli.py export june.csv --month 2025-06
+    python cli.py backup nightly.json.gz
+    python cli.py restore nightly.json.gz
+    python cli.py snapshot weekly.db
+    python cli.py incremental monday.ndjson.gz
+    python cli.py restore-snapshot weekly.db monday.ndjson.gz tuesday.ndjson.gz
+    python cli.py import statement.csv
+    python cli.py trends --period week --category Food
+    python cli.py recurring add 25000 Rent --frequency monthly --start 2025-01-01
+    python cli.py recurring run
+    python cli.py --ledger Business add 1200 Travel
+    python cli.py edit --month 2025-06 --search coffee --set-category Dining
+    python cli.py delete --id 41 42 43
+"""
+import argparse
+import csv
+import math
+import sqlite3
+import sys
+from datetime import date
+
+from expense_store import (ExpenseStore, open_backup, is_ndjson, month_range, date_range, 
+                           parse_amount, format_amount, parse_date, parse_pragmas, 
+                           crossed_budget_threshold, describe_budget, ledger_path, list_ledgers, 
+                           find_ledger, DEFAULT_LEDGER, DEFAULT_PRAGMAS, RECURRING_FREQUENCIES, SEARCH_LIMIT)
+
+def add_filter_arguments(parser):
+    """Add the date range and category filter options to a subcommand"""
+    period = parser.add_mutually_exclusive_group()
+    period.add_argument('--month', help="only expenses in this month (YYYY-MM)")
+    period.add_argument('--from', dest='from_date', help="first date to include (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='to_date', help="last date to include (YYYY-MM-DD)")
+    parser.add_argument('--category', help="only expenses in this category")
+
+def parse_filter(args):
+    """Return the (date_range, category) filter selected on the command line"""
+    if args.month:
+        if args.to_date:
+            raise ValueError("--to cannot be combined with --month")
+        return month_range(args.month), args.category
+    if args.from_date or args.to_date:
+        return date_range(args.from_date, args.to_date), args.category
+    return None, args.category
+
+def add_selection_arguments(parser):
+    """Add the options choosing the expenses a bulk change applies to"""
+    parser.add_argument('--id', dest='ids', type=int, nargs='+', 
+                        help="expense ids, instead of a filter")
+    add_filter_arguments(parser)
+    parser.add_argument('--search', help="only expenses whose description matches these words")
+
+def parse_selection(args):
+    """Return the ids or filter selected on the command line as keyword
+    arguments for delete_expenses and update_expenses
+    """
+    if args.ids:
+        if args.month or args.from_date or args.to_date or args.category or args.search:
+            raise ValueError("--id cannot be combined with a filter")
+        return {'ids': args.ids}
+    filter_range, category = parse_filter(args)
+    return {'date_range': filter_range, 'category': category, 'text': args.search}
+
+def open_output(filename):
+    """Open a CSV output file, with '-' meaning standard output"""
+    if filename == '-':
+        return open(sys.stdout.fileno(), 'w', newline='', encoding='utf-8', closefd=False)
+    return open(filename, 'w', newline='', encoding='utf-8', buffering=1 << 20)
+
+def cmd_add(store, args):
+    expense_date = args.date or date.today().isoformat()
+    parse_date(expense_date)
+    if not args.category.strip():
+        raise ValueError("Please select a category")
+    expense_id = store.add_expense(args.amount, args.category, args.description, expense_date)
+    print(f"Added expense {expense_id}")
+    budget = store.budget_status(expense_date[:7], args.category)
+    if budget and crossed_budget_threshold(budget[0] - args.amount, *budget):
+        print(f"Warning: {describe_budget(args.category, expense_date[:7], *budget)}", 
+              file=sys.stderr)
+
+def cmd_delete(store, args):
+    rows = store.delete_expenses(**parse_selection(args))
+    print(f"Deleted {len(rows)} expenses")
+
+def cmd_edit(store, args):
+    changes = {column: value for column, value in (('date', args.set_date), 
+                                                   ('category', args.set_category), 
+                                                   ('description', args.set_description)) 
+               if value is not None}
+    rows = store.update_expenses(changes, **parse_selection(args))
+    print(f"Updated {len(rows)} expenses")
+
+def cmd_query(store, args):
+    filter_range, category = parse_filter(args)
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    remaining = args.limit
+    after = None
+    while remaining is None or remaining > 0:
+        page = store.fetch_page(filter_range, category, after, 
+                                limit=1000 if remaining is None else min(remaining, 1000))
+        if not page:
+            break
+        writer.writerows((row[0], row[1], row[2], row[3] or '', format_amount(row[4])) for row in page)
+        after = (page[-1][1], page[-1][0])
+        if remaining is not None:
+            remaining -= len(page)
+
+def cmd_search(store, args):
+    filter_range, category = parse_filter(args)
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerows((row[0], row[1], row[2], row[3] or '', format_amount(row[4])) 
+                     for row in store.search(args.text, filter_range, category, args.limit))
+
+def cmd_totals(store, args):
+    filter_range, category = parse_filter(args)
+    totals = store.category_totals(filter_range, category)
+    for name, amount in totals:
+        print(f"{name}\t{format_amount(amount)}")
+    print(f"Total\t{format_amount(sum(amount for _, amount in totals))}")
+
+def format_number(value, spec='.2f'):
+    """Format a trend figure, leaving undefined (NaN) values blank"""
+    return '' if math.isnan(value) else format(value, spec)
+
+def cmd_trends(store, args):
+    filter_range, category = parse_filter(args)
+    report = store.trends(filter_range, category, args.period, args.window)
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerow([args.period.capitalize(), 'Total', f'Average ({args.window})', 'Change', 'Change %'])
+    writer.writerows(
+        (label, f"{total:.2f}", format_number(average), format_number(change), format_number(percent, '.1f'))
+        for label, total, average, change, percent in zip(
+            report['labels'], report['totals'], report['average'], report['change'], report['percent']))
+    
+    if report['categories']:
+        print()
+        writer.writerow([f"Category ({report['month']})", 'Total', f'Average ({args.window})', 
+                         'Change', 'Change %'])
+        writer.writerows(
+            (row['category'], f"{row['total']:.2f}", format_number(row['average']), 
+             format_number(row['change']), format_number(row['percent'], '.1f'))
+            for row in report['categories'])
+    
+    if report['forecast_month']:
+        print(f"\nForecast for {report['forecast_month']}: {report['forecast']:.2f} "
+              f"({report['forecast_method']})")
+
+def cmd_export(store, args):
+    filter_range, category = parse_filter(args)
+    with open_output(args.file) as f:
+        count = 0
+        for count in store.export_csv(f, filter_range, category):
+            pass
+    print(f"Exported {count} records", file=sys.stderr)
+
+def cmd_import(store, args):
+    stats = {}
+    with open(args.file, 'r', newline='', encoding='utf-8-sig') as f:
+        count = 0
+        for count in store.import_csv(f, stats):
+            pass
+    print(f"Imported {stats['imported']} of {count} rows, skipped {stats['duplicates']} "
+          f"duplicates and {stats['invalid']} invalid rows")
+    for error in stats['errors']:
+        print(error, file=sys.stderr)
+
+def cmd_backup(store, args):
+    with open(args.file, 'wb') as raw, open_backup(raw, args.file, 'w') as f:
+        count = 0
+        for count in store.backup(f, ndjson=is_ndjson(args.file)):
+            pass
+    print(f"Backup of {count} records saved to {args.file}")
+
+def cmd_restore(store, args):
+    with open(args.file, 'rb') as raw, open_backup(raw, args.file, 'r') as f:
+        count = 0
+        for count in store.restore(f, ndjson=is_ndjson(args.file)):
+            pass
+    print(f"Restored {count} records")
+
+def cmd_snapshot(store, args):
+    store.snapshot(args.file)
+    print(f"Snapshot saved to {args.file}; incremental backups now follow it")
+
+def cmd_incremental(store, args):
+    count = 0
+    for count in store.incremental_backup(args.file):
+        pass
+    print(f"Incremental backup of {count} added or changed records saved to {args.file}")
+
+def cmd_restore_snapshot(store, args):
+    count = 0
+    for count in store.restore_snapshot(args.snapshot, args.incrementals):
+        pass
+    print(f"Restored {args.snapshot} and {len(args.incrementals)} incremental backups "
+          f"({count} records replayed)")
+
+def cmd_recurring_add(store, args):
+    rule_id = store.add_recurring_rule(args.amount, args.category, args.description, 
+                                       args.frequency, args.start or date.today().isoformat(), 
+                                       args.end)
+    print(f"Added recurring rule {rule_id}")
+    print(f"Added {store.materialize_recurring()} recurring expenses")
+
+def cmd_recurring_list(store, args):
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerows((rule[0], format_amount(rule[1]), rule[2], rule[3] or '', rule[4], rule[5], 
+                      rule[6] or '', rule[7] or '') 
+                     for rule in store.get_recurring_rules())
+
+def cmd_recurring_delete(store, args):
+    store.delete_recurring_rule(args.id)
+    print(f"Deleted recurring rule {args.id}")
+
+def cmd_recurring_run(store, args):
+    until = parse_date(args.until) if args.until else None
+    print(f"Added {store.materialize_recurring(until)} recurring expenses")
+
+def cmd_budget_set(store, args):
+    store.set_budget(args.category, args.amount)
+    print(f"Set the monthly budget of {args.category} to Rs:{format_amount(args.amount)}")
+
+def cmd_budget_clear(store, args):
+    store.set_budget(args.category, None)
+    print(f"Removed the monthly budget of {args.category}")
+
+def cmd_budget_list(store, args):
+    month = args.month or date.today().strftime('%Y-%m')
+    # month_range validates the format
+    month_range(month)
+    writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+    writer.writerows((category, format_amount(spent), format_amount(budget), 
+                      f"{spent * 100 // budget}%")
+                     for category, spent, budget in store.get_budgets(month))
+
+def cmd_ledgers(store, args):
+    for name in list_ledgers(args.db):
+        print(name)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Personal Expense Tracker command line")
+    parser.add_argument('--db', default='expenses.db', help="database file (default: expenses.db)")
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER, 
+                        help=f"ledger to use; other ledgers are kept in ledgers/ next to the "
+                             f"database, and a new one is created by the first command adding "
+                             f"expenses to it (default: {DEFAULT_LEDGER})")
+    parser.add_argument('--pragma', action='append', default=[], metavar='NAME=VALUE', 
+                        help="override a SQLite setting, e.g. synchronous=FULL "
+                             f"({', '.join(DEFAULT_PRAGMAS)})")
+    parser.set_defaults(creates_ledger=False)
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    add = commands.add_parser('add', help="add an expense")
+    add.add_argument('amount', type=parse_amount)
+    add.add_argument('category')
+    add.add_argument('--description', default='')
+    add.add_argument('--date', help="expense date (YYYY-MM-DD, default: today)")
+    add.set_defaults(func=cmd_add, creates_ledger=True)
+    
+    delete = commands.add_parser('delete', help="delete expenses by id or every expense "
+                                 "matching a filter")
+    add_selection_arguments(delete)
+    delete.set_defaults(func=cmd_delete)
+    
+    edit = commands.add_parser('edit', help="change the date, category or description of "
+                               "expenses by id or every expense matching a filter")
+    add_selection_arguments(edit)
+    edit.add_argument('--set-date', help="new date (YYYY-MM-DD)")
+    edit.add_argument('--set-category', help="new category")
+    edit.add_argument('--set-description', help="new description")
+    edit.set_defaults(func=cmd_edit)
+    
+    query = commands.add_parser('query', help="list expenses, newest first, as tab-separated rows")
+    add_filter_arguments(query)
+    query.add_argument('--limit', type=int, help="maximum number of rows")
+    query.set_defaults(func=cmd_query)
+    
+    search = commands.add_parser('search', help="find expenses by words in their description, "
+                                 "best matches first")
+    search.add_argument('text')
+    add_filter_arguments(search)
+    search.add_argument('--limit', type=int, default=SEARCH_LIMIT, 
+                        help=f"maximum number of rows (default: {SEARCH_LIMIT})")
+    search.set_defaults(func=cmd_search)
+    
+    totals = commands.add_parser('totals', help="show totals per category")
+    add_filter_arguments(totals)
+    totals.set_defaults(func=cmd_totals)
+    
+    trends = commands.add_parser('trends', help="show spending trends and a forecast for next month")
+    add_filter_arguments(trends)
+    trends.add_argument('--period', choices=['day', 'week', 'month'], default='month', 
+                        help="length of each period in the series (default: month)")
+    trends.add_argument('--window', type=int, default=3, 
+                        help="number of periods in the rolling average (default: 3)")
+    trends.set_defaults(func=cmd_trends)
+    
+    export = commands.add_parser('export', help="export expenses to CSV ('-' for stdout)")
+    export.add_argument('file')
+    add_filter_arguments(export)
+    export.set_defaults(func=cmd_export)
+    
+    import_ = commands.add_parser('import', help="import expenses from CSV, skipping duplicates")
+    import_.add_argument('file')
+    import_.set_defaults(func=cmd_import, creates_ledger=True)
+    
+    recurring = commands.add_parser('recurring', help="manage recurring expenses")
+    recurring_commands = recurring.add_subparsers(dest='recurring_command', required=True)
+    
+    recurring_add = recurring_commands.add_parser('add', help="add a recurring expense and any "
+                                                  "occurrences already due")
+    recurring_add.add_argument('amount', type=parse_amount)
+    recurring_add.add_argument('category')
+    recurring_add.add_argument('--description', default='')
+    recurring_add.add_argument('--frequency', choices=RECURRING_FREQUENCIES, default='monthly')
+    recurring_add.add_argument('--start', help="first occurrence (YYYY-MM-DD, default: today)")
+    recurring_add.add_argument('--end', help="last day an occurrence may fall on (YYYY-MM-DD)")
+    recurring_add.set_defaults(func=cmd_recurring_add, creates_ledger=True)
+    
+    recurring_list = recurring_commands.add_parser('list', help="list recurring rules")
+    recurring_list.set_defaults(func=cmd_recurring_list)
+    
+    recurring_delete = recurring_commands.add_parser('delete', help="stop a recurring rule, "
+                                                     "keeping the expenses it added")
+    recurring_delete.add_argument('id', type=int)
+    recurring_delete.set_defaults(func=cmd_recurring_delete)
+    
+    recurring_run = recurring_commands.add_parser('run', help="add every recurring expense "
+                                                  "that is due")
+    recurring_run.add_argument('--until', help="add occurrences up to this date (default: today)")
+    recurring_run.set_defaults(func=cmd_recurring_run)
+    
+    budget = commands.add_parser('budget', help="manage monthly category budgets")
+    budget_commands = budget.add_subparsers(dest='budget_command', required=True)
+    
+    budget_set = budget_commands.add_parser('set', help="set a category's monthly budget")
+    budget_set.add_argument('category')
+    budget_set.add_argument('amount', type=parse_amount)
+    budget_set.set_defaults(func=cmd_budget_set, creates_ledger=True)
+    
+    budget_clear = budget_commands.add_parser('clear', help="remove a category's monthly budget")
+    budget_clear.add_argument('category')
+    budget_clear.set_defaults(func=cmd_budget_clear)
+    
+    budget_list = budget_commands.add_parser('list', help="show spending against each budget "
+                                             "as tab-separated rows")
+    budget_list.add_argument('--month', help="month to report (YYYY-MM, default: this month)")
+    budget_list.set_defaults(func=cmd_budget_list)
+    
+    backup = commands.add_parser('backup', help="back up all expenses to JSON/NDJSON (.gz/.bz2/.xz)")
+    backup.add_argument('file')
+    backup.set_defaults(func=cmd_backup)
+    
+    restore = commands.add_parser('restore', help="replace all expenses with a backup")
+    restore.add_argument('file')
+    restore.set_defaults(func=cmd_restore, creates_ledger=True)
+    
+    snapshot = commands.add_parser('snapshot', help="save a full copy of the database as a new "
+                                   "SQLite file and start an incremental backup chain")
+    snapshot.add_argument('file')
+    snapshot.set_defaults(func=cmd_snapshot)
+    
+    incremental = commands.add_parser('incremental', help="back up the expenses changed since the "
+                                      "last snapshot or incremental backup (NDJSON)")
+    incremental.add_argument('file')
+    incremental.set_defaults(func=cmd_incremental)
+    
+    restore_snapshot = commands.add_parser('restore-snapshot', help="replace the database with a "
+                                           "snapshot and the incremental backups made after it")
+    restore_snapshot.add_argument('snapshot')
+    restore_snapshot.add_argument('incrementals', nargs='*', metavar='incremental', 
+                                  help="incremental backup files, in any order")
+    restore_snapshot.set_defaults(func=cmd_restore_snapshot, creates_ledger=True)
+    
+    ledgers = commands.add_parser('ledgers', help="list the ledgers")
+    ledgers.set_defaults(func=cmd_ledgers)
+    
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        ledgers = list_ledgers(args.db)
+        if not args.creates_ledger and find_ledger(args.ledger, args.db) not in ledgers:
+            # Reading from a misspelt ledger would otherwise create it empty
+            raise ValueError(f"no ledger named '{args.ledger}'; the ledgers are "
+                             f"{', '.join(ledgers)}")
+        path = ledger_path(args.ledger, args.db, create=args.creates_ledger)
+        with ExpenseStore(path, parse_pragmas(args.pragma)) as store:
+            args.func(store, args)
+    except (ValueError, OSError, OverflowError, sqlite3.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1796 @@
+"""SQLite storage and queries for the expense tracker.
+
+Everything here is independent of Tk and matplotlib, so it can be used
+from the GUI, the command line (cli.py) or batch scripts alike.
+
+Amounts are stored and returned as integer paisa (1/100 rupee) so that
+totals are exact; use parse_amount and format_amount at the edges.
+CSV exports and JSON backups keep amounts in rupees.
+"""
+import sqlite3
+import json
+import csv
+import gzip
+import bz2
+import lzma
+import io
+import itertools
+import os
+import tempfile
+import uuid
+import re
+import calendar
+from collections import Counter
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Number of rows fetched per keyset page of the expense history
+PAGE_SIZE = 100
+
+# Amounts must be below this many paisa (Rs 10 trillion), which keeps even
+# the sum of millions of expenses within SQLite's 64-bit integers
+MAX_PAISA = 10 ** 15
+
+# Rows per executemany batch when restoring a backup
+RESTORE_BATCH_SIZE = 10000
+
+# Rows per fetchmany chunk when writing a backup
+BACKUP_CHUNK_SIZE = 5000
+
+# Database pages copied per step of a snapshot; progress is reported between steps
+SNAPSHOT_PAGES = 1024
+
+# Rows per fetchmany/writerows chunk when exporting CSV
+EXPORT_CHUNK_SIZE = 10000
+
+CSV_HEADER = ['Date', 'Category', 'Description', 'Amount']
+
+# Rows per executemany batch when importing CSV
+IMPORT_BATCH_SIZE = 10000
+
+# Largest number of bound parameters used in one IN (...) list
+MAX_IN_PARAMS = 500
+
+# Maximum number of matches returned by a description search, and the most
+# matches that are ranked by relevance before falling back to newest first
+SEARCH_LIMIT = 500
+SEARCH_RANK_LIMIT = 10000
+
+# Words shorter than this are ignored while searching; one-letter prefixes
+# would match most of the index
+MIN_SEARCH_WORD = 2
+
+# Schedules supported by recurring expense rules
+RECURRING_FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+# Columns a bulk edit may set, in the order they appear in its SET clause
+EDITABLE_COLUMNS = ('date', 'category', 'description')
+
+# Percentages of a monthly category budget at which an alert is raised
+BUDGET_THRESHOLDS = (80, 100)
+
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+# The default ledger is the main database; every other ledger is a database
+# of its own in LEDGER_DIR next to it
+DEFAULT_LEDGER = 'Personal'
+LEDGER_DIR = 'ledgers'
+LEDGER_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9 _-]{0,39}')
+
+# Compression applied to backup files, chosen by file extension
+BACKUP_CODECS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+try:
+    from compression import zstd
+    BACKUP_CODECS['.zst'] = zstd.open
+except ImportError:
+    pass
+
+def parse_amount(value):
+    """Convert a rupee amount, as text such as '1,234.5' or a number, to integer paisa
+    
+    Rounds half away from zero to the nearest paisa. Raises ValueError for
+    anything that is not a finite number or is not below MAX_PAISA.
+    """
+    if isinstance(value, int):
+        paisa = value * 100
+    else:
+        text = value.strip().replace(',', '') if isinstance(value, str) else repr(value)
+        try:
+            amount = Decimal(text)
+            if not amount.is_finite():
+                raise InvalidOperation
+            paisa = int(amount.scaleb(2).to_integral_value(rounding=ROUND_HALF_UP))
+        except ArithmeticError:
+            # InvalidOperation for text that is not a number, Overflow for huge exponents
+            raise ValueError(f"invalid amount '{value}'") from None
+    if abs(paisa) >= MAX_PAISA:
+        raise ValueError(f"amount '{value}' is too large")
+    return paisa
+
+def format_amount(paisa):
+    """Format integer paisa as rupees with two decimals, e.g. 123450 -> '1234.50'"""
+    if paisa < 0:
+        return '-' + format_amount(-paisa)
+    return f"{paisa // 100}.{paisa % 100:02d}"
+
+def parse_date(text):
+    """Parse a YYYY-MM-DD date, raising ValueError with a readable message"""
+    try:
+        if DATE_PATTERN.fullmatch(text):
+            return date.fromisoformat(text)
+    except ValueError:
+        pass
+    raise ValueError(f"invalid date '{text}'; expected YYYY-MM-DD")
+
+def add_months(day, months):
+    """Shift a date by whole months, clamping to the end of shorter months"""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return day.replace(year=year, month=month, 
+                       day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def occurrence_dates(start, frequency, after, until):
+    """Yield the dates of a daily, weekly or monthly schedule beginning on
+    start that fall strictly after after (None for no lower bound) and no
+    later than until
+    
+    Monthly schedules keep the day of month of start, falling back to the
+    last day of shorter months. Catching up skips straight to after
+    rather than walking every earlier occurrence.
+    """
+    index = 0
+    if after is not None and after >= start:
+        if frequency == 'monthly':
+            index = (after.year - start.year) * 12 + after.month - start.month
+        else:
+            index = (after - start).days // (1 if frequency == 'daily' else 7)
+    
+    while True:
+        if frequency == 'monthly':
+            day = add_months(start, index)
+        else:
+            day = start + timedelta(days=index * (1 if frequency == 'daily' else 7))
+        if day > until:
+            return
+        if after is None or day > after:
+            yield day
+        index += 1
+
+def ledger_path(name, default_path='expenses.db', create=False):
+    """Return the database path of a ledger, creating its directory if asked"""
+    if name.lower() == DEFAULT_LEDGER.lower():
+        return default_path
+    if not LEDGER_NAME.fullmatch(name):
+        raise ValueError(f"invalid ledger name '{name}'; use up to 40 letters, digits, "
+                         "spaces, '-' or '_'")
+    directory = os.path.join(os.path.dirname(default_path), LEDGER_DIR)
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, find_ledger(name, default_path) + '.db')
+
+def list_ledgers(default_path='expenses.db'):
+    """Return the default ledger followed by the other ledgers in name order"""
+    directory = os.path.join(os.path.dirname(default_path), LEDGER_DIR)
+    try:
+        files = os.listdir(directory)
+    except FileNotFoundError:
+        files = []
+    names = sorted((name[:-3] for name in files 
+                    if name.endswith('.db') and LEDGER_NAME.fullmatch(name[:-3]) 
+                    and name[:-3].lower() != DEFAULT_LEDGER.lower()), key=str.lower)
+    return [DEFAULT_LEDGER] + names
+
+def find_ledger(name, default_path='expenses.db'):
+    """Return the existing ledger whose name matches name ignoring case, or name"""
+    for ledger in list_ledgers(default_path):
+        if ledger.lower() == name.lower():
+            return ledger
+    return name
+
+def month_range(month):
+    """Return the half-open (start, end) date range covering a YYYY-MM month"""
+    start = datetime.strptime(month + "-01", "%Y-%m-%d").date()
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.isoformat(), end.isoformat()
+
+def date_range(from_date, to_date):
+    """Return the half-open (start, end) range for inclusive YYYY-MM-DD bounds.
+    
+    Either bound may be empty to leave that side of the range open.
+    """
+    start = end = None
+    if from_date:
+        start = datetime.strptime(from_date, "%Y-%m-%d").date().isoformat()
+    if to_date:
+        end = (datetime.strptime(to_date, "%Y-%m-%d").date() + timedelta(days=1)).isoformat()
+    return start, end
+
+def describe_range(start, end):
+    """Describe a half-open date range for display"""
+    if start and end and start.endswith("-01") and month_range(start[:7])[1] == end:
+        return start[:7]
+    last = None
+    if end:
+        last = (datetime.strptime(end, "%Y-%m-%d").date() - timedelta(days=1)).isoformat()
+    if start and last:
+        return f"{start} to {last}"
+    if start:
+        return f"{start} onwards"
+    return f"up to {last}"
+
+def describe_filter(date_range, category=None):
+    """Describe a date range and category filter for display"""
+    parts = []
+    if category:
+        parts.append(category)
+    if date_range:
+        parts.append(describe_range(*date_range))
+    return ", ".join(parts)
+
+def range_clause(date_range, category=None):
+    """Build index-friendly SQL conditions for a half-open (start, end) date range
+    and an optional category
+    """
+    conditions = []
+    params = []
+    if category:
+        conditions.append('category = ?')
+        params.append(category)
+    if date_range:
+        start, end = date_range
+        if start:
+            conditions.append('date >= ?')
+            params.append(start)
+        if end:
+            conditions.append('date < ?')
+            params.append(end)
+    return conditions, params
+
+def where_sql(conditions):
+    """Join SQL conditions into a WHERE clause (empty when unfiltered)"""
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+def selection_clause(ids=None, date_range=None, category=None, text=None):
+    """Build SQL conditions selecting expenses by id, or else by a filter and
+    description search, for bulk changes
+    
+    ids are bound as a single JSON array, so a selection of any size stays
+    one statement. Raises ValueError when nothing narrows the selection, so
+    a bulk change never reaches every expense by accident.
+    """
+    if ids is not None:
+        return ['id IN (SELECT value FROM json_each(?))'], [json.dumps([int(i) for i in ids])]
+    
+    conditions, params = range_clause(date_range, category)
+    if text:
+        query = search_query(text)
+        if not query:
+            raise ValueError(f"search text '{text}' has no words of at least "
+                             f"{MIN_SEARCH_WORD} letters")
+        conditions.append('id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)')
+        params.append(query)
+    if not conditions:
+        raise ValueError("Select expenses or set a filter first")
+    return conditions, params
+
+# Indexes for date-ordered paging, range filters and per-category charts
+EXPENSE_INDEXES = {
+    'idx_expenses_date_id': '''
+        CREATE INDEX IF NOT EXISTS idx_expenses_date_id 
+        ON expenses (date, id)
+    ''',
+    'idx_expenses_category_date': '''
+        CREATE INDEX IF NOT EXISTS idx_expenses_category_date 
+        ON expenses (category, date)
+    ''',
+}
+
+# Triggers keeping the expense_totals rollup in step with the expenses table.
+# Only deleting or changing the current min/max of a group rescans that month
+# and category, through idx_expenses_category_date; other rows adjust the
+# group in place, so bulk edits stay linear in the rows they touch.
+ROLLUP_TRIGGERS = {
+    'expenses_totals_insert': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_totals_insert 
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO expense_totals (month, category, total, count, min_amount, max_amount)
+            VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1, NEW.amount, NEW.amount)
+            ON CONFLICT (month, category) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + 1,
+                min_amount = MIN(min_amount, excluded.min_amount),
+                max_amount = MAX(max_amount, excluded.max_amount);
+        END
+    ''',
+    'expenses_totals_delete': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_totals_delete 
+        AFTER DELETE ON expenses
+        BEGIN
+            UPDATE expense_totals SET
+                total = total - OLD.amount,
+                count = count - 1,
+                min_amount = CASE WHEN OLD.amount > min_amount THEN min_amount ELSE COALESCE((
+                    SELECT MIN(amount) FROM expenses
+                    WHERE category = OLD.category
+                      AND date >= substr(OLD.date, 1, 7) || '-01'
+                      AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')
+                ), 0) END,
+                max_amount = CASE WHEN OLD.amount < max_amount THEN max_amount ELSE COALESCE((
+                    SELECT MAX(amount) FROM expenses
+                    WHERE category = OLD.category
+                      AND date >= substr(OLD.date, 1, 7) || '-01'
+                      AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')
+                ), 0) END
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+            DELETE FROM expense_totals 
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+        END
+    ''',
+    'expenses_totals_update': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_totals_update 
+        AFTER UPDATE OF amount, category, date ON expenses
+        BEGIN
+            UPDATE expense_totals SET
+                total = total - OLD.amount,
+                count = count - 1,
+                min_amount = CASE WHEN OLD.amount > min_amount THEN min_amount ELSE COALESCE((
+                    SELECT MIN(amount) FROM expenses
+                    WHERE category = OLD.category
+                      AND date >= substr(OLD.date, 1, 7) || '-01'
+                      AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')
+                ), 0) END,
+                max_amount = CASE WHEN OLD.amount < max_amount THEN max_amount ELSE COALESCE((
+                    SELECT MAX(amount) FROM expenses
+                    WHERE category = OLD.category
+                      AND date >= substr(OLD.date, 1, 7) || '-01'
+                      AND date < date(substr(OLD.date, 1, 7) || '-01', '+1 month')
+                ), 0) END
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+            DELETE FROM expense_totals 
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+            INSERT INTO expense_totals (month, category, total, count, min_amount, max_amount)
+            VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1, NEW.amount, NEW.amount)
+            ON CONFLICT (month, category) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + 1,
+                min_amount = MIN(min_amount, excluded.min_amount),
+                max_amount = MAX(max_amount, excluded.max_amount);
+        END
+    ''',
+}
+
+# Triggers keeping the expenses_fts description index in step with expenses.
+# expenses_fts is an external-content table, so deletes must pass the old text.
+SEARCH_TRIGGERS = {
+    'expenses_fts_insert': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_insert 
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END
+    ''',
+    'expenses_fts_delete': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete 
+        AFTER DELETE ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description) 
+            VALUES ('delete', OLD.id, OLD.description);
+        END
+    ''',
+    'expenses_fts_update': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update 
+        AFTER UPDATE OF description ON expenses
+        WHEN OLD.description IS NOT NEW.description
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description) 
+            VALUES ('delete', OLD.id, OLD.description);
+            INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END
+    ''',
+}
+
+# Triggers logging changed and deleted expenses for incremental backups. Only
+# expenses the latest backup checkpoint already covers are logged: newer ones
+# are found by id, and nothing is logged before the first snapshot.
+CHANGE_TRIGGERS = {
+    'expenses_log_update': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_log_update 
+        AFTER UPDATE ON expenses
+        WHEN OLD.id <= (SELECT last_expense_id FROM backup_checkpoints ORDER BY id DESC LIMIT 1)
+        BEGIN
+            INSERT INTO expense_changes (expense_id) VALUES (OLD.id);
+        END
+    ''',
+    'expenses_log_delete': '''
+        CREATE TRIGGER IF NOT EXISTS expenses_log_delete 
+        AFTER DELETE ON expenses
+        WHEN OLD.id <= (SELECT last_expense_id FROM backup_checkpoints ORDER BY id DESC LIMIT 1)
+        BEGIN
+            INSERT INTO expense_changes (expense_id) VALUES (OLD.id);
+        END
+    ''',
+}
+
+def rebuild_totals(cursor):
+    """Recompute the expense_totals rollup from scratch"""
+    cursor.execute('DELETE FROM expense_totals')
+    cursor.execute('''
+        INSERT INTO expense_totals (month, category, total, count, min_amount, max_amount)
+        SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*), MIN(amount), MAX(amount)
+        FROM expenses
+        GROUP BY substr(date, 1, 7), category
+    ''')
+
+def rebuild_search_index(cursor):
+    """Rebuild the expenses_fts description index from the expenses table"""
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+def search_query(text):
+    """Turn typed text into an FTS5 query matching every word as a prefix
+    
+    Words are quoted, so FTS5 operators and punctuation in the text are
+    treated as plain words. Returns None when the text has no words of at
+    least MIN_SEARCH_WORD characters.
+    """
+    words = [word for word in re.findall(r'\w+', text) if len(word) >= MIN_SEARCH_WORD]
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def budget_threshold(spent, budget):
+    """Return the highest of BUDGET_THRESHOLDS that spent has reached, or None"""
+    reached = [threshold for threshold in BUDGET_THRESHOLDS if spent * 100 >= budget * threshold]
+    return reached[-1] if reached else None
+
+def crossed_budget_threshold(before, after, budget):
+    """Return the threshold that spending rising from before to after newly
+    reached, or None if it reached no higher threshold
+    """
+    if after <= before:
+        return None
+    threshold = budget_threshold(after, budget)
+    if threshold != budget_threshold(before, budget):
+        return threshold
+    return None
+
+def describe_budget(category, month, spent, budget):
+    """Describe spending against a monthly budget, e.g. for an alert"""
+    if spent > budget:
+        return (f"{category} is Rs:{format_amount(spent - budget)} over its "
+                f"Rs:{format_amount(budget)} budget for {month}")
+    return (f"{category} has used {spent * 100 // budget}% of its "
+            f"Rs:{format_amount(budget)} budget for {month} (Rs:{format_amount(spent)})")
+
+def category_totals(cursor, date_range=None, category=None, counts=False):
+    """Return (category, total) pairs for a date range, largest first.
+    
+    Whole months are read from the expense_totals rollup; only the partial
+    months at either end of the range touch the expenses table. With counts
+    set, the number of expenses is returned instead of the amount.
+    """
+    rollup_measure = 'SUM(count)' if counts else 'SUM(total)'
+    raw_measure = 'COUNT(*)' if counts else 'SUM(amount)'
+    start, end = date_range or (None, None)
+    month_start = start
+    if start and not start.endswith('-01'):
+        month_start = month_range(start[:7])[1]
+    month_end = end
+    if end and not end.endswith('-01'):
+        month_end = end[:7] + '-01'
+    
+    totals = {}
+    def add_rows(rows):
+        for category, amount in rows:
+            totals[category] = totals.get(category, 0) + amount
+    
+    if month_start and month_end and month_start >= month_end:
+        # Range lies within a single month
+        conditions, params = range_clause(date_range, category)
+        cursor.execute(f'''
+            SELECT category, {raw_measure} FROM expenses 
+            {where_sql(conditions)} 
+            GROUP BY category
+        ''', params)
+        add_rows(cursor.fetchall())
+    else:
+        conditions = []
+        params = []
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if month_start:
+            conditions.append('month >= ?')
+            params.append(month_start[:7])
+        if month_end:
+            conditions.append('month < ?')
+            params.append(month_end[:7])
+        cursor.execute(f'''
+            SELECT category, {rollup_measure} FROM expense_totals 
+            {where_sql(conditions)} 
+            GROUP BY category
+        ''', params)
+        add_rows(cursor.fetchall())
+        
+        # Partial months at the edges of the range
+        for edge in ((start, month_start), (month_end, end)):
+            if edge[0] != edge[1]:
+                conditions, params = range_clause(edge, category)
+                cursor.execute(f'''
+                    SELECT category, {raw_measure} FROM expenses 
+                    {where_sql(conditions)} 
+                    GROUP BY category
+                ''', params)
+                add_rows(cursor.fetchall())
+    
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+WHITESPACE = re.compile(r'\s*')
+
+class BackupReader:
+    """Incrementally parse the expenses array of a JSON backup file.
+    
+    Only one record is held in memory at a time, so restoring does not
+    depend on the size of the backup.
+    """
+    
+    def __init__(self, f, chunk_size=1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+    
+    def fill(self):
+        """Read the next chunk, dropping the consumed part of the buffer"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+    
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+    
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Invalid backup file: expected '{char}'")
+        self.pos += 1
+    
+    def decode(self):
+        """Decode the next JSON value, reading more input until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A value ending exactly at the buffer end may be a truncated number
+            if end == len(self.buffer) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+    
+    def records(self):
+        """Yield expense dicts from the backup's top-level 'expenses' array"""
+        self.expect('{')
+        while self.peek() != '}':
+            key = self.decode()
+            self.expect(':')
+            if key == 'expenses':
+                self.expect('[')
+                while self.peek() != ']':
+                    yield self.decode()
+                    if self.peek() == ',':
+                        self.pos += 1
+                self.pos += 1
+            else:
+                self.decode()
+            if self.peek() == ',':
+                self.pos += 1
+
+def write_csv_export(conn, f, date_range=None, category=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write expenses matching a filter to f as CSV, newest first.
+    
+    Rows are streamed with fetchmany and written with writerows, so memory
+    use stays flat. Yields the number of rows written after each chunk.
+    """
+    conditions, params = range_clause(date_range, category)
+    cursor = conn.execute(f'''
+        SELECT date, category, COALESCE(description, ''), printf('%.2f', amount / 100.0)
+        FROM expenses 
+        {where_sql(conditions)}
+        ORDER BY date DESC, id DESC
+    ''', params)
+    
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        writer.writerows(rows)
+        count += len(rows)
+        yield count
+
+def parse_csv_rows(rows, columns, first_line, stats):
+    """Validate CSV rows into (amount, category, description, date) tuples.
+    
+    Invalid rows are counted in stats and skipped.
+    """
+    date_col, category_col, description_col, amount_col = columns
+    width = max(columns) + 1
+    parsed = []
+    for line, row in enumerate(rows, first_line):
+        try:
+            if len(row) < width:
+                raise ValueError("missing columns")
+            expense_date = row[date_col].strip()
+            if not DATE_PATTERN.fullmatch(expense_date):
+                raise ValueError(f"invalid date '{expense_date}'")
+            date.fromisoformat(expense_date)
+            category = row[category_col].strip()
+            if not category:
+                raise ValueError("missing category")
+            amount = parse_amount(row[amount_col])
+        except ValueError as e:
+            stats['invalid'] += 1
+            if len(stats['errors']) < 10:
+                stats['errors'].append(f"Line {line}: {e}")
+            continue
+        parsed.append((amount, category, row[description_col].strip(), expense_date))
+    return parsed
+
+def import_csv(conn, f, stats, batch_size=IMPORT_BATCH_SIZE):
+    """Import expenses from CSV in the layout written by write_csv_export.
+    
+    Rows are validated and inserted in executemany batches inside a single
+    transaction. Rows matching an existing expense (same date, category,
+    description and amount) are skipped using an in-memory hash index of
+    the existing rows for the dates seen, loaded through the date index.
+    Identical rows are only skipped as many times as they already exist,
+    so importing the same file twice adds nothing. Counts are recorded in
+    stats and the number of rows read is yielded after each batch.
+    """
+    stats.update(imported=0, duplicates=0, invalid=0, errors=[])
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    
+    # Use the header when present, otherwise assume the export column order
+    names = [name.strip().lower() for name in header]
+    first_line = 2
+    if all(column.lower() in names for column in CSV_HEADER):
+        columns = [names.index(column.lower()) for column in CSV_HEADER]
+    else:
+        columns = list(range(len(CSV_HEADER)))
+        reader = itertools.chain([header], reader)
+        first_line = 1
+    
+    existing = Counter()
+    loaded_dates = set()
+    insert_sql = '''
+        INSERT INTO expenses (amount, category, description, date)
+        VALUES (?, ?, ?, ?)
+    '''
+    
+    read = 0
+    while True:
+        rows = list(itertools.islice(reader, batch_size))
+        if not rows:
+            break
+        batch = parse_csv_rows(rows, columns, first_line + read, stats)
+        read += len(rows)
+        
+        # Load existing rows for dates not seen yet into the hash index
+        new_dates = sorted({expense[3] for expense in batch} - loaded_dates)
+        for i in range(0, len(new_dates), MAX_IN_PARAMS):
+            chunk = new_dates[i:i + MAX_IN_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            existing.update(conn.execute(f'''
+                SELECT amount, category, COALESCE(description, ''), date 
+                FROM expenses 
+                WHERE date IN ({placeholders})
+            ''', chunk))
+        loaded_dates.update(new_dates)
+        
+        new_rows = []
+        for expense in batch:
+            if existing[expense] > 0:
+                existing[expense] -= 1
+                stats['duplicates'] += 1
+            else:
+                new_rows.append(expense)
+        
+        conn.executemany(insert_sql, new_rows)
+        stats['imported'] += len(new_rows)
+        yield read
+    
+    conn.execute('INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM expenses')
+    conn.commit()
+
+def materialize_recurring(conn, until=None):
+    """Insert every occurrence of the recurring rules due up to until (default
+    today) in one transaction and return the number of expenses added.
+    
+    Each rule remembers the date it has been materialized through, so a run
+    only generates occurrences after that date; years of backlog become one
+    executemany per rule. Occurrences already present are skipped by the
+    unique (recurring_rule_id, date) index, so running twice adds nothing.
+    """
+    until = until or date.today()
+    insert_sql = '''
+        INSERT OR IGNORE INTO expenses (amount, category, description, date, recurring_rule_id)
+        VALUES (?, ?, ?, ?, ?)
+    '''
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, amount, category, description, frequency, start_date, end_date, 
+               materialized_through
+        FROM recurring_rules
+        WHERE start_date <= ? 
+          AND (materialized_through IS NULL 
+               OR (materialized_through < ? AND (end_date IS NULL OR materialized_through < end_date)))
+    ''', (until.isoformat(), until.isoformat()))
+    rules = cursor.fetchall()
+    if not rules:
+        return 0
+    
+    added = 0
+    try:
+        for (rule_id, amount, category, description, frequency, start_date, end_date, 
+             materialized_through) in rules:
+            last = min(until, date.fromisoformat(end_date)) if end_date else until
+            after = date.fromisoformat(materialized_through) if materialized_through else None
+            cursor.executemany(insert_sql, [
+                (amount, category, description, day.isoformat(), rule_id)
+                for day in occurrence_dates(date.fromisoformat(start_date), frequency, after, last)
+            ])
+            added += max(cursor.rowcount, 0)
+            cursor.execute('UPDATE recurring_rules SET materialized_through = ? WHERE id = ?', 
+                           (until.isoformat(), rule_id))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return added
+
+def open_backup(raw, filename, mode):
+    """Wrap a binary file in text I/O, compressing according to the file extension"""
+    for suffix, opener in BACKUP_CODECS.items():
+        if filename.endswith(suffix):
+            return opener(raw, mode + 't', encoding='utf-8')
+    return io.TextIOWrapper(raw, encoding='utf-8')
+
+def is_ndjson(filename):
+    """Check whether a backup file name uses the newline-delimited JSON layout"""
+    for suffix in BACKUP_CODECS:
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+    return filename.endswith(('.ndjson', '.jsonl'))
+
+def iter_ndjson_records(f):
+    """Yield expense dicts from a newline-delimited JSON backup"""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+# Columns of an expense as backups store it, with the amount in rupees
+BACKUP_COLUMNS = 'id, amount / 100.0, category, description, date, created_at, recurring_rule_id'
+
+def expense_record(exp):
+    """Turn a row of BACKUP_COLUMNS into a backup record"""
+    fields = {
+        'id': exp[0],
+        'amount': exp[1],
+        'category': exp[2],
+        'description': exp[3],
+        'date': exp[4],
+        'created_at': exp[5]
+    }
+    if exp[6] is not None:
+        fields['recurring_rule_id'] = exp[6]
+    return fields
+
+def write_backup(conn, f, ndjson=False, chunk_size=BACKUP_CHUNK_SIZE):
+    """Write every expense to f, one record at a time.
+    
+    Rows are fetched in chunks, so memory use does not depend on the size of
+    the table. Yields the number of records written after each chunk.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT {BACKUP_COLUMNS} FROM expenses ORDER BY id')
+    
+    count = 0
+    if not ndjson:
+        f.write('{\n  "expenses": [')
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        
+        parts = []
+        for exp in rows:
+            record = json.dumps(expense_record(exp), ensure_ascii=False)
+            if ndjson:
+                parts.append(record + '\n')
+            else:
+                parts.append(('\n    ' if count == 0 else ',\n    ') + record)
+            count += 1
+        f.write(''.join(parts))
+        yield count
+    
+    if not ndjson:
+        backup_date = json.dumps(datetime.now().isoformat())
+        f.write(f'\n  ],\n  "backup_date": {backup_date},\n  "total_records": {count}\n}}\n')
+    yield count
+
+# Keys every expense record in a backup must have
+RECORD_KEYS = ('amount', 'category', 'date')
+
+def parse_backup_record(exp, number, require_id=False):
+    """Validate an expense record from a backup into an (id, amount,
+    category, description, date, created_at, recurring_rule_id) row
+    
+    Raises ValueError naming the record number, so a restore rolls back
+    with a readable error instead of storing a bad row.
+    """
+    try:
+        if not isinstance(exp, dict):
+            raise ValueError("not a JSON object")
+        required = ('id',) + RECORD_KEYS if require_id else RECORD_KEYS
+        for key in required:
+            if exp.get(key) is None:
+                raise ValueError(f"missing {key}")
+        expense_id = exp.get('id')
+        if expense_id is not None and (type(expense_id) is not int or expense_id < 1):
+            raise ValueError(f"invalid id {expense_id!r}")
+        category = exp['category']
+        if not isinstance(category, str) or not category.strip():
+            raise ValueError("missing category")
+        if not isinstance(exp['date'], str):
+            raise ValueError(f"invalid date {exp['date']!r}; expected YYYY-MM-DD")
+        parse_date(exp['date'])
+        amount = parse_amount(exp['amount'])
+    except ValueError as e:
+        raise ValueError(f"Record {number}: {e}") from None
+    return (expense_id, amount, category, exp.get('description'), exp['date'], 
+            exp.get('created_at'), exp.get('recurring_rule_id'))
+
+def restore_expenses(conn, records, batch_size=RESTORE_BATCH_SIZE):
+    """Replace all expenses with records in a single transaction.
+    
+    Ids and created_at timestamps are kept, and rupee amounts are converted
+    to paisa. Indexes, rollup and search triggers are dropped for the bulk
+    load and rebuilt once at the end. The restored expenses no longer match
+    any snapshot, so the incremental backup chain starts over. Yields the
+    number of records written after each batch so callers can report progress.
+    """
+    cursor = conn.cursor()
+    conn.commit()
+    journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+    synchronous = cursor.execute('PRAGMA synchronous').fetchone()[0]
+    # Leaving WAL needs the only connection to the database, and other
+    # connections (the app's worker and UI) may be open, so WAL is kept
+    if journal_mode.lower() != 'wal':
+        cursor.execute('PRAGMA journal_mode = MEMORY')
+    cursor.execute('PRAGMA synchronous = OFF')
+    
+    try:
+        cursor.execute('BEGIN')
+        for name in itertools.chain(ROLLUP_TRIGGERS, SEARCH_TRIGGERS, CHANGE_TRIGGERS):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for name in EXPENSE_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        cursor.execute('DELETE FROM expenses')
+        
+        insert_sql = '''
+            INSERT INTO expenses (id, amount, category, description, date, created_at, 
+                                  recurring_rule_id)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        '''
+        count = 0
+        batch = []
+        for number, exp in enumerate(records, 1):
+            batch.append(parse_backup_record(exp, number))
+            if len(batch) >= batch_size:
+                cursor.executemany(insert_sql, batch)
+                count += len(batch)
+                batch.clear()
+                yield count
+        if batch:
+            cursor.executemany(insert_sql, batch)
+            count += len(batch)
+        
+        for index_sql in EXPENSE_INDEXES.values():
+            cursor.execute(index_sql)
+        for trigger_sql in itertools.chain(ROLLUP_TRIGGERS.values(), SEARCH_TRIGGERS.values(), 
+                                           CHANGE_TRIGGERS.values()):
+            cursor.execute(trigger_sql)
+        rebuild_totals(cursor)
+        rebuild_search_index(cursor)
+        cursor.execute('INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM expenses')
+        cursor.execute('DELETE FROM expense_changes')
+        cursor.execute('DELETE FROM backup_checkpoints')
+        conn.commit()
+        yield count
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        if journal_mode.lower() != 'wal':
+            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        cursor.execute(f'PRAGMA synchronous = {synchronous}')
+
+def latest_checkpoint(cursor):
+    """Return (token, last_expense_id, last_change) of the newest backup
+    checkpoint, or None before the first snapshot
+    """
+    return cursor.execute('''
+        SELECT token, last_expense_id, last_change
+        FROM backup_checkpoints
+        ORDER BY id DESC LIMIT 1
+    ''').fetchone()
+
+def change_watermarks(cursor):
+    """Return the newest expense id and change log entry"""
+    last_expense_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM expenses').fetchone()[0]
+    last_change = cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM expense_changes').fetchone()[0]
+    return last_expense_id, last_change
+
+def add_checkpoint(cursor, token, kind, last_expense_id, last_change):
+    """Record a backup checkpoint and drop the change log entries it covers"""
+    cursor.execute('''
+        INSERT INTO backup_checkpoints (token, kind, last_expense_id, last_change)
+        VALUES (?, ?, ?, ?)
+    ''', (token, kind, last_expense_id, last_change))
+    cursor.execute('DELETE FROM expense_changes WHERE seq <= ?', (last_change,))
+
+def database_file(conn):
+    """Return the file of a connection's main database, or '' in memory"""
+    return conn.execute("SELECT file FROM pragma_database_list WHERE name = 'main'").fetchone()[0]
+
+def check_backup_target(conn, path):
+    """Raise ValueError if path is the database a connection has open"""
+    live = database_file(conn)
+    if live and (os.path.abspath(path) == os.path.abspath(live) 
+                 or os.path.exists(path) and os.path.samefile(path, live)):
+        raise ValueError(f"{path} is the database being backed up; choose another file")
+
+def temporary_file(path):
+    """Create an empty file next to path, to be renamed over it once complete"""
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', 
+                                     dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    return temp_path
+
+def remove_database_files(path):
+    """Remove a database file and any journal SQLite left beside it"""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def write_snapshot(conn, path, progress=None, pages=SNAPSHOT_PAGES):
+    """Copy the whole database to a new SQLite file at path with the online
+    backup API, and start a new chain of incremental backups from it.
+    
+    The copy is taken within one read transaction, so it is consistent while
+    other connections keep working; progress(copied, total) is called with
+    page counts between steps and may raise to cancel. The copy is written
+    under a temporary name and only replaces path once complete. Returns the
+    token of the checkpoint shared by the snapshot and the database.
+    """
+    check_backup_target(conn, path)
+    cursor = conn.cursor()
+    conn.commit()
+    token = uuid.uuid4().hex
+    temp_path = temporary_file(path)
+    target = None
+    try:
+        # Reading the watermarks starts the read transaction the copy sees;
+        # a write lock instead would block the backup on its own connection
+        cursor.execute('BEGIN')
+        last_expense_id, last_change = change_watermarks(cursor)
+        target = sqlite3.connect(temp_path)
+        conn.backup(target, pages=pages, progress=progress and 
+                    (lambda status, remaining, total: progress(total - remaining, total)))
+        
+        target_cursor = target.cursor()
+        add_checkpoint(target_cursor, token, 'snapshot', last_expense_id, last_change)
+        target.commit()
+        # A snapshot is a single self-contained file
+        target_cursor.execute('PRAGMA journal_mode = DELETE')
+        target.close()
+        target = None
+        
+        # Fails with "database is locked" if another connection wrote since
+        # the copy began, as the checkpoint would then miss those changes
+        add_checkpoint(cursor, token, 'snapshot', last_expense_id, last_change)
+        os.replace(temp_path, path)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        if target is not None:
+            target.close()
+        remove_database_files(temp_path)
+        raise
+    return token
+
+def write_incremental_backup(conn, path, chunk_size=BACKUP_CHUNK_SIZE):
+    """Write the expenses added, changed or deleted since the last backup
+    checkpoint to the file at path as newline-delimited JSON, compressed
+    according to its extension, and start a new checkpoint.
+    
+    The first line names the checkpoint the backup follows and the one it
+    creates. Categories and recurring rules come next in full, as they are
+    small, then the ids of deleted expenses and the added or changed
+    expenses as backup records. The file is written under a temporary name,
+    synced and renamed into place before the checkpoint is committed, so
+    the change log is only trimmed once the changes are safely on disk.
+    Raises ValueError before the first snapshot. Yields the number of
+    expenses written after each chunk.
+    """
+    check_backup_target(conn, path)
+    cursor = conn.cursor()
+    conn.commit()
+    cursor.execute('BEGIN IMMEDIATE')
+    temp_path = None
+    try:
+        base = latest_checkpoint(cursor)
+        if base is None:
+            raise ValueError("Make a full snapshot before the first incremental backup")
+        base_token, base_expense_id, base_change = base
+        last_expense_id, last_change = change_watermarks(cursor)
+        token = uuid.uuid4().hex
+        header = {
+            'base': base_token,
+            'checkpoint': token,
+            'last_expense_id': max(last_expense_id, base_expense_id),
+            'created': datetime.now().isoformat()
+        }
+        
+        temp_path = temporary_file(path)
+        with open(temp_path, 'wb') as raw, open_backup(raw, path, 'w') as f:
+            f.write(json.dumps({'incremental': header}) + '\n')
+            
+            categories = cursor.execute('SELECT name, monthly_budget FROM categories ORDER BY name')
+            f.write(json.dumps({'categories': categories.fetchall()}, ensure_ascii=False) + '\n')
+            rules = cursor.execute('''
+                SELECT id, amount, category, description, frequency, start_date, end_date,
+                       materialized_through
+                FROM recurring_rules
+                ORDER BY id
+            ''')
+            f.write(json.dumps({'recurring_rules': rules.fetchall()}, ensure_ascii=False) + '\n')
+            
+            cursor.execute('''
+                SELECT DISTINCT expense_id
+                FROM expense_changes AS c
+                WHERE seq > ? AND NOT EXISTS (SELECT 1 FROM expenses WHERE id = c.expense_id)
+                ORDER BY expense_id
+            ''', (base_change,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                f.write(json.dumps({'deleted': [row[0] for row in rows]}) + '\n')
+            
+            # Expenses newer than the last checkpoint, then older ones changed since
+            cursor.execute(f'''
+                SELECT {BACKUP_COLUMNS} FROM expenses WHERE id > ?
+                UNION ALL
+                SELECT {BACKUP_COLUMNS} FROM expenses
+                WHERE id IN (SELECT expense_id FROM expense_changes WHERE seq > ?) AND id <= ?
+            ''', (base_expense_id, base_change, base_expense_id))
+            count = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                f.write(''.join(json.dumps(expense_record(exp), ensure_ascii=False) + '\n'
+                                for exp in rows))
+                count += len(rows)
+                yield count
+        
+        with open(temp_path, 'rb') as written:
+            os.fsync(written.fileno())
+        add_checkpoint(cursor, token, 'incremental', header['last_expense_id'],
+                       max(last_change, base_change))
+        os.replace(temp_path, path)
+        conn.commit()
+        yield count
+    except BaseException:
+        conn.rollback()
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def read_incremental_header(f, name):
+    """Read the first line of an incremental backup and return its header"""
+    try:
+        return json.loads(f.readline())['incremental']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f"{name} is not an incremental backup") from None
+
+def replay_incremental(cursor, f, batch_size=RESTORE_BATCH_SIZE):
+    """Apply the lines of an incremental backup that follow its header,
+    within the caller's transaction
+    
+    Yields the number of expenses added or replaced after each batch.
+    """
+    upsert_sql = '''
+        INSERT INTO expenses (id, amount, category, description, date, created_at,
+                              recurring_rule_id)
+        VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        ON CONFLICT (id) DO UPDATE SET
+            amount = excluded.amount, category = excluded.category,
+            description = excluded.description, date = excluded.date,
+            created_at = excluded.created_at, recurring_rule_id = excluded.recurring_rule_id
+    '''
+    count = 0
+    batch = []
+    # Numbered by line, after the header on line 1
+    for number, record in enumerate(iter_ndjson_records(f), 2):
+        if 'categories' in record:
+            cursor.executemany('''
+                INSERT INTO categories (name, monthly_budget) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET monthly_budget = excluded.monthly_budget
+            ''', record['categories'])
+        elif 'recurring_rules' in record:
+            cursor.execute('DELETE FROM recurring_rules')
+            cursor.executemany('''
+                INSERT INTO recurring_rules (id, amount, category, description, frequency,
+                                             start_date, end_date, materialized_through)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', record['recurring_rules'])
+        elif 'deleted' in record:
+            cursor.execute('DELETE FROM expenses WHERE id IN (SELECT value FROM json_each(?))',
+                           (json.dumps(record['deleted']),))
+        else:
+            batch.append(parse_backup_record(record, number, require_id=True))
+            if len(batch) >= batch_size:
+                cursor.executemany(upsert_sql, batch)
+                count += len(batch)
+                batch.clear()
+                yield count
+    if batch:
+        cursor.executemany(upsert_sql, batch)
+        count += len(batch)
+    yield count
+
+def order_incrementals(token, headers):
+    """Order (name, header) pairs into the chain of incremental backups
+    that follows the checkpoint token, raising ValueError for any gap
+    """
+    following = {header['base']: (name, header) for name, header in headers}
+    chain = []
+    while token in following and len(chain) < len(headers):
+        name, header = following.pop(token)
+        chain.append((name, header))
+        token = header['checkpoint']
+    if following:
+        name = min(name for name, _ in following.values())
+        raise ValueError(f"{os.path.basename(name)} does not continue the backup chain "
+                         "of the snapshot")
+    return chain
+
+def restore_snapshot(conn, snapshot_path, incremental_paths=(), work_dir=None):
+    """Replace the whole database with a snapshot and the chain of
+    incremental backups made after it, in any order.
+    
+    The result is built in a temporary database in work_dir and copied over
+    the live one in a single step at the end, so a failed or cancelled
+    restore leaves the database as it was. Yields the number of expenses
+    replayed after each batch.
+    """
+    if not os.path.exists(snapshot_path):
+        raise FileNotFoundError(f"No such snapshot: {snapshot_path}")
+    fd, work_path = tempfile.mkstemp(suffix='.db', dir=work_dir)
+    os.close(fd)
+    work = sqlite3.connect(work_path)
+    try:
+        # The work database is thrown away on failure, so it needs no syncing
+        work.execute('PRAGMA synchronous = OFF')
+        source = sqlite3.connect(snapshot_path)
+        try:
+            source.backup(work)
+        finally:
+            source.close()
+        migrate(work)
+        cursor = work.cursor()
+        
+        checkpoint = latest_checkpoint(cursor)
+        headers = []
+        for path in incremental_paths:
+            with open(path, 'rb') as raw, open_backup(raw, path, 'r') as f:
+                headers.append((path, read_incremental_header(f, os.path.basename(path))))
+        if headers and checkpoint is None:
+            raise ValueError("The snapshot does not start an incremental backup chain")
+        chain = order_incrementals(checkpoint and checkpoint[0], headers)
+        
+        count = 0
+        for path, header in chain:
+            cursor.execute('BEGIN')
+            with open(path, 'rb') as raw, open_backup(raw, path, 'r') as f:
+                f.readline()
+                replayed = 0
+                for replayed in replay_incremental(cursor, f):
+                    yield count + replayed
+                count += replayed
+            # The restored database carries on the chain from the last backup
+            last_change = change_watermarks(cursor)[1]
+            add_checkpoint(cursor, header['checkpoint'], 'incremental',
+                           header['last_expense_id'], last_change)
+            work.commit()
+        
+        conn.commit()
+        work.backup(conn)
+        yield count
+    finally:
+        work.close()
+        remove_database_files(work_path)
+
+EXPENSES_COLUMNS = '''(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    amount INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    date TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)'''
+
+DEFAULT_CATEGORIES = ['Food', 'Transportation', 'Entertainment', 'Shopping', 
+                      'Bills', 'Healthcare', 'Education', 'Others']
+
+# Connection settings applied on every open; connect_database(pragmas=...)
+# overrides individual entries. WAL lets readers run alongside the writer
+# and, with synchronous=NORMAL, syncs only at checkpoints.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # negative values are KiB, so about 16 MB
+    'mmap_size': 268435456,     # 256 MB of memory-mapped reads
+    'temp_store': 'MEMORY',
+}
+
+PRAGMA_VALUE = re.compile(r'-?\w+')
+
+def table_exists(cursor, name):
+    """Check whether a table (or virtual table) exists"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def create_base_tables(cursor):
+    """Create the expenses and categories tables with the default categories"""
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS expenses {EXPENSES_COLUMNS}')
+    
+    # Categories table for suggestions
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    ''')
+    cursor.executemany('INSERT OR IGNORE INTO categories (name) VALUES (?)', 
+                       [(category,) for category in DEFAULT_CATEGORIES])
+
+def convert_amounts_to_paisa(cursor):
+    """Rebuild the expenses table with amounts in integer paisa.
+    
+    Databases created before amounts were integers store REAL rupees. Ids,
+    the AUTOINCREMENT counter and the search index rowids are kept. The old
+    table's indexes and triggers go with it and the rollup is dropped so the
+    following migrations recreate them with integer totals.
+    """
+    cursor.execute("SELECT type FROM pragma_table_info('expenses') WHERE name = 'amount'")
+    if cursor.fetchone()[0].upper() != 'REAL':
+        return
+    
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'")
+    row = cursor.fetchone()
+    sequence = row[0] if row else 0
+    
+    cursor.execute(f'CREATE TABLE expenses_paisa {EXPENSES_COLUMNS}')
+    cursor.execute('''
+        INSERT INTO expenses_paisa (id, amount, category, description, date, created_at)
+        SELECT id, CAST(ROUND(amount * 100) AS INTEGER), category, description, date, created_at
+        FROM expenses
+    ''')
+    cursor.execute('DROP TABLE expenses')
+    cursor.execute('ALTER TABLE expenses_paisa RENAME TO expenses')
+    cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", 
+                   (sequence,))
+    cursor.execute('DROP TABLE IF EXISTS expense_totals')
+
+def create_expense_indexes(cursor):
+    """Create the indexes for date-ordered paging, range filters and per-category charts"""
+    for index_sql in EXPENSE_INDEXES.values():
+        cursor.execute(index_sql)
+
+def create_rollup(cursor):
+    """Create the monthly per-category rollup used for totals and charts"""
+    rollup_exists = table_exists(cursor, 'expense_totals')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_totals (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            min_amount INTEGER NOT NULL,
+            max_amount INTEGER NOT NULL,
+            PRIMARY KEY (month, category)
+        ) WITHOUT ROWID
+    ''')
+    for trigger_sql in ROLLUP_TRIGGERS.values():
+        cursor.execute(trigger_sql)
+    if not rollup_exists:
+        rebuild_totals(cursor)
+
+def create_search_index(cursor):
+    """Create the full-text index over descriptions, backfilled when first created"""
+    search_exists = table_exists(cursor, 'expenses_fts')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description, content='expenses', content_rowid='id', prefix='2 3'
+        )
+    ''')
+    for trigger_sql in SEARCH_TRIGGERS.values():
+        cursor.execute(trigger_sql)
+    if not search_exists:
+        rebuild_search_index(cursor)
+
+def create_recurring_rules(cursor):
+    """Create the recurring expense rules and link materialized expenses to them.
+    
+    The unique index on (recurring_rule_id, date) makes materializing the
+    same occurrence twice a no-op.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly')),
+            start_date TEXT NOT NULL,
+            end_date TEXT,
+            materialized_through TEXT
+        )
+    ''')
+    cursor.execute("SELECT 1 FROM pragma_table_info('expenses') WHERE name = 'recurring_rule_id'")
+    if cursor.fetchone() is None:
+        cursor.execute('ALTER TABLE expenses ADD COLUMN recurring_rule_id INTEGER')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_recurring 
+        ON expenses (recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL
+    ''')
+
+def add_category_budgets(cursor):
+    """Add the optional monthly budget, in paisa, to each category"""
+    cursor.execute("SELECT 1 FROM pragma_table_info('categories') WHERE name = 'monthly_budget'")
+    if cursor.fetchone() is None:
+        cursor.execute('ALTER TABLE categories ADD COLUMN monthly_budget INTEGER')
+
+def narrow_totals_update(cursor):
+    """Recreate the rollup update trigger, which used to rescan the minimum
+    and maximum of a month for every changed expense
+    """
+    cursor.execute('DROP TRIGGER IF EXISTS expenses_totals_update')
+    cursor.execute(ROLLUP_TRIGGERS['expenses_totals_update'])
+
+def create_change_log(cursor):
+    """Create the backup checkpoints and the log of changed and deleted
+    expenses that incremental backups read
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS backup_checkpoints (
+            id INTEGER PRIMARY KEY,
+            token TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            last_expense_id INTEGER NOT NULL,
+            last_change INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS expense_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            expense_id INTEGER NOT NULL
+        )
+    ''')
+    for trigger_sql in CHANGE_TRIGGERS.values():
+        cursor.execute(trigger_sql)
+
+def narrow_search_update(cursor):
+    """Recreate the search index update trigger, which used to reindex every
+    expense whose description was set, even to the same text
+    """
+    cursor.execute('DROP TRIGGER IF EXISTS expenses_fts_update')
+    cursor.execute(SEARCH_TRIGGERS['expenses_fts_update'])
+
+# Schema migrations in order. PRAGMA user_version records how many have been
+# applied, so each runs once. Databases from before versioning start at 0;
+# every step copes with objects that already exist. Append new steps only.
+MIGRATIONS = [
+    create_base_tables,
+    convert_amounts_to_paisa,
+    create_expense_indexes,
+    create_rollup,
+    create_search_index,
+    create_recurring_rules,
+    add_category_budgets,
+    narrow_totals_update,
+    create_change_log,
+    narrow_search_update,
+]
+
+def migrate(conn):
+    """Apply the migrations the database has not seen yet, each in its own transaction
+    
+    Each step reads the version again once it holds the write lock, so
+    connections opening a new database at the same time apply it only once.
+    """
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    while version < len(MIGRATIONS):
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(MIGRATIONS):
+                MIGRATIONS[version](cursor)
+                version += 1
+                cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def apply_pragmas(conn, pragmas=None):
+    """Apply DEFAULT_PRAGMAS, with any entries of pragmas taking precedence"""
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+    for name, value in settings.items():
+        if name not in DEFAULT_PRAGMAS or not PRAGMA_VALUE.fullmatch(str(value)):
+            raise ValueError(f"Unsupported pragma setting {name}={value}")
+        conn.execute(f'PRAGMA {name} = {value}')
+
+def parse_pragmas(settings):
+    """Parse NAME=VALUE strings, as given on the command line, into a pragma dict"""
+    pragmas = {}
+    for setting in settings:
+        name, sep, value = setting.partition('=')
+        name = name.strip().lower()
+        if not sep or name not in DEFAULT_PRAGMAS:
+            raise ValueError(f"Expected NAME=VALUE with NAME one of {', '.join(DEFAULT_PRAGMAS)}, "
+                             f"got '{setting}'")
+        pragmas[name] = value.strip()
+    return pragmas
+
+def connect_database(path='expenses.db', pragmas=None, factory=sqlite3.Connection):
+    """Open the SQLite database, tune the connection and bring the schema up to date
+    
+    factory is passed to sqlite3.connect, e.g. to record statement timings.
+    """
+    conn = sqlite3.connect(path, factory=factory)
+    apply_pragmas(conn, pragmas)
+    migrate(conn)
+    return conn
+
+class ExpenseStore:
+    """Expense storage API on top of a single SQLite connection.
+    
+    Methods that stream large amounts of data (export, backup, restore and
+    import) return generators yielding progress counts; exhaust them to run
+    the operation to completion.
+    """
+    
+    def __init__(self, path='expenses.db', pragmas=None, factory=sqlite3.Connection):
+        self.path = path
+        self.conn = connect_database(path, pragmas, factory)
+    
+    def close(self):
+        self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def get_categories(self):
+        """Return all category names in alphabetical order"""
+        return [row[0] for row in self.conn.execute('SELECT name FROM categories ORDER BY name')]
+    
+    def add_expense(self, amount, category, description, expense_date):
+        """Insert an expense with amount in paisa and return its id
+        
+        Raises ValueError unless expense_date is a YYYY-MM-DD date, which
+        the ordering, range filters and monthly rollup all rely on.
+        """
+        parse_date(expense_date)
+        cursor = self.conn.execute('''
+            INSERT INTO expenses (amount, category, description, date)
+            VALUES (?, ?, ?, ?)
+        ''', (amount, category, description, expense_date))
+        
+        # Add category if new
+        self.conn.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
+        
+        self.conn.commit()
+        return cursor.lastrowid
+    
+    def delete_expense(self, expense_id):
+        """Delete an expense, returning its (date, category, amount) or None"""
+        row = self.conn.execute('SELECT date, category, amount FROM expenses WHERE id = ?', 
+                                (expense_id,)).fetchone()
+        self.conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+        self.conn.commit()
+        return row
+    
+    def delete_expenses(self, ids=None, date_range=None, category=None, text=None):
+        """Delete the expenses with the given ids, or else every expense
+        matching a filter and description search, in one transaction
+        
+        Returns the deleted (id, date, category, amount) rows.
+        """
+        conditions, params = selection_clause(ids, date_range, category, text)
+        cursor = self.conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rows = cursor.execute(f'''
+                SELECT id, date, category, amount FROM expenses {where_sql(conditions)}
+            ''', params).fetchall()
+            cursor.execute(f'DELETE FROM expenses {where_sql(conditions)}', params)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return rows
+    
+    def update_expenses(self, changes, ids=None, date_range=None, category=None, text=None):
+        """Set the date, category and/or description of the expenses selected
+        as in delete_expenses, with one UPDATE in one transaction
+        
+        changes maps names in EDITABLE_COLUMNS to their new values. Returns
+        the (id, date, category, description, amount) rows as they were
+        before the change.
+        """
+        if not changes:
+            raise ValueError("Nothing to change")
+        unknown = set(changes) - set(EDITABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"cannot edit {', '.join(sorted(unknown))}")
+        if 'date' in changes:
+            parse_date(changes['date'])
+        if 'category' in changes and not changes['category'].strip():
+            raise ValueError("Please select a category")
+        
+        conditions, params = selection_clause(ids, date_range, category, text)
+        columns = [column for column in EDITABLE_COLUMNS if column in changes]
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        cursor = self.conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rows = cursor.execute(f'''
+                SELECT id, date, category, description, amount 
+                FROM expenses 
+                {where_sql(conditions)}
+            ''', params).fetchall()
+            cursor.execute(f'UPDATE expenses SET {assignments} {where_sql(conditions)}', 
+                           [changes[column] for column in columns] + params)
+            if 'category' in changes:
+                cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', 
+                               (changes['category'],))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return rows
+    
+    def set_budget(self, category, amount):
+        """Set the monthly budget of a category in paisa, or remove it with None"""
+        if not category.strip():
+            raise ValueError("Please select a category")
+        if amount is not None and amount <= 0:
+            raise ValueError("budget must be greater than zero")
+        self.conn.execute('''
+            INSERT INTO categories (name, monthly_budget) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET monthly_budget = excluded.monthly_budget
+        ''', (category, amount))
+        self.conn.commit()
+    
+    def get_budgets(self, month):
+        """Return (category, spent, budget) for every category with a budget,
+        with spent being its total for month (YYYY-MM)
+        """
+        return self.conn.execute('''
+            SELECT c.name, COALESCE(t.total, 0), c.monthly_budget
+            FROM categories c
+            LEFT JOIN expense_totals t ON t.month = ? AND t.category = c.name
+            WHERE c.monthly_budget IS NOT NULL
+            ORDER BY c.name
+        ''', (month,)).fetchall()
+    
+    def budget_status(self, month, category):
+        """Return (spent, budget) for a category in month (YYYY-MM), or None
+        if it has no budget
+        
+        Spending comes from the rollup row the expense triggers keep current,
+        so checking after every add or delete is a single key lookup.
+        """
+        return self.conn.execute('''
+            SELECT COALESCE(t.total, 0), c.monthly_budget
+            FROM categories c
+            LEFT JOIN expense_totals t ON t.month = ? AND t.category = c.name
+            WHERE c.name = ? AND c.monthly_budget IS NOT NULL
+        ''', (month, category)).fetchone()
+    
+    def add_recurring_rule(self, amount, category, description, frequency, start_date, 
+                           end_date=None):
+        """Create a daily, weekly or monthly recurring expense and return its id
+        
+        amount is in paisa and dates are YYYY-MM-DD strings; end_date is the
+        last day an occurrence may fall on. Nothing is added to expenses until
+        materialize_recurring runs.
+        """
+        if frequency not in RECURRING_FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(RECURRING_FREQUENCIES)}")
+        if not category.strip():
+            raise ValueError("Please select a category")
+        start = parse_date(start_date)
+        if end_date and parse_date(end_date) < start:
+            raise ValueError("end date is before the start date")
+        
+        cursor = self.conn.execute('''
+            INSERT INTO recurring_rules (amount, category, description, frequency, start_date, end_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (amount, category, description, frequency, start_date, end_date or None))
+        self.conn.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
+        self.conn.commit()
+        return cursor.lastrowid
+    
+    def get_recurring_rules(self):
+        """Return (id, amount, category, description, frequency, start_date,
+        end_date, materialized_through) for every recurring rule
+        """
+        return self.conn.execute('''
+            SELECT id, amount, category, description, frequency, start_date, end_date, 
+                   materialized_through
+            FROM recurring_rules 
+            ORDER BY id
+        ''').fetchall()
+    
+    def delete_recurring_rule(self, rule_id):
+        """Stop a recurring rule; expenses it already added are kept"""
+        self.conn.execute('DELETE FROM recurring_rules WHERE id = ?', (rule_id,))
+        self.conn.commit()
+    
+    def materialize_recurring(self, until=None):
+        """Add all recurring expenses due up to until (a date, default today)
+        and return how many were added
+        """
+        return materialize_recurring(self.conn, until)
+    
+    def fetch_page(self, date_range=None, category=None, after=None, limit=PAGE_SIZE):
+        """Return up to limit (id, date, category, description, amount) rows,
+        newest first, continuing strictly after the (date, id) key in after
+        """
+        conditions, params = range_clause(date_range, category)
+        if after:
+            # Keyset pagination: continue strictly after the last loaded row
+            conditions.append('(date, id) < (?, ?)')
+            params.extend(after)
+        
+        return self.conn.execute(f'''
+            SELECT id, date, category, description, amount 
+            FROM expenses 
+            {where_sql(conditions)}
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+    
+    def search(self, text, date_range=None, category=None, limit=SEARCH_LIMIT):
+        """Return up to limit (id, date, category, description, amount) rows
+        whose description contains every word of text as a prefix
+        
+        Results are ranked by bm25 relevance. When more than SEARCH_RANK_LIMIT
+        expenses match, scoring them all would take too long and the terms
+        say little about relevance, so the most recently added come first.
+        """
+        query = search_query(text)
+        if not query:
+            return []
+        
+        conditions, params = range_clause(date_range, category)
+        conditions.insert(0, 'expenses_fts MATCH ?')
+        params.insert(0, query)
+        matches_sql = f'''
+            FROM expenses_fts JOIN expenses ON expenses.id = expenses_fts.rowid
+            {where_sql(conditions)}
+        '''
+        
+        # Counting stops after SEARCH_RANK_LIMIT + 1 matches
+        matches = self.conn.execute(f'SELECT COUNT(*) FROM (SELECT 1 {matches_sql} LIMIT ?)', 
+                                    (*params, SEARCH_RANK_LIMIT + 1)).fetchone()[0]
+        if matches <= SEARCH_RANK_LIMIT:
+            order = 'bm25(expenses_fts), expenses_fts.rowid DESC'
+        else:
+            order = 'expenses_fts.rowid DESC'
+        
+        return self.conn.execute(f'''
+            SELECT id, date, category, expenses.description, amount
+            {matches_sql}
+            ORDER BY {order}
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+    
+    def category_totals(self, date_range=None, category=None, counts=False):
+        """Return (category, total paisa) pairs for a filter, largest first"""
+        return category_totals(self.conn.cursor(), date_range, category, counts)
+    
+    def total(self, date_range=None, category=None):
+        """Return the total amount spent for a filter, in paisa"""
+        return sum(total for _, total in self.category_totals(date_range, category))
+    
+    def count(self, date_range=None, category=None):
+        """Return the number of expenses matching a filter"""
+        return sum(count for _, count in self.category_totals(date_range, category, counts=True))
+    
+    def trends(self, date_range=None, category=None, period='month', window=3):
+        """Return spending series, category changes and a forecast for a filter
+        
+        See analytics.trend_report; NumPy is imported on first use.
+        """
+        import analytics
+        return analytics.trend_report(self.conn, date_range, category, period, window)
+    
+    def export_csv(self, f, date_range=None, category=None):
+        """Write matching expenses to f as CSV; yields progress counts"""
+        return write_csv_export(self.conn, f, date_range, category)
+    
+    def import_csv(self, f, stats):
+        """Import expenses from CSV, skipping existing rows; yields progress counts"""
+        return import_csv(self.conn, f, stats)
+    
+    def backup(self, f, ndjson=False):
+        """Write every expense to f as a JSON backup; yields progress counts"""
+        return write_backup(self.conn, f, ndjson)
+    
+    def restore(self, f, ndjson=False):
+        """Replace all expenses with a JSON backup read from f; yields progress counts"""
+        records = iter_ndjson_records(f) if ndjson else BackupReader(f).records()
+        return restore_expenses(self.conn, records)
+    
+    def snapshot(self, path, progress=None):
+        """Save a consistent copy of the whole database to path and start a
+        new incremental backup chain; progress(copied, total) counts pages
+        """
+        return write_snapshot(self.conn, path, progress)
+    
+    def incremental_backup(self, path):
+        """Save the expenses changed since the last snapshot or incremental
+        backup to the file at path; yields progress counts
+        """
+        return write_incremental_backup(self.conn, path)
+    
+    def restore_snapshot(self, path, incrementals=()):
+        """Replace the database with a snapshot and the incremental backups
+        made after it; yields progress counts
+        """
+        work_dir = os.path.dirname(os.path.abspath(self.path))
+        return restore_snapshot(self.conn, path, incrementals, work_dir)
@@ -0,0 +1,266 @@
+"""Performance instrumentation for the expense tracker.
+
+PerfStats collects how long SQL statements, database jobs and Tk callbacks
+take. Opening the database with ProfiledConnection as the sqlite3 factory
+records every statement, including the time spent fetching its rows:
+
+    stats = PerfStats()
+    store = ExpenseStore(factory=profiled_connection(stats))
+
+Everything recorded is also written to the 'expense_tracker.perf' logger;
+setup_log sends it to a rotating file. Nothing here imports Tk, and none of
+it is used unless instrumentation is switched on.
+"""
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+logger = logging.getLogger('expense_tracker.perf')
+
+# Records at least this slow are logged as warnings
+SLOW_MS = 100
+
+# Size of each log file and how many old ones are kept
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUP_COUNT = 3
+
+# Longest SQL text kept as a statistics label
+MAX_LABEL = 200
+
+# Functions listed in a cProfile report
+PROFILE_REPORT_LINES = 30
+
+WHITESPACE = re.compile(r'\s+')
+
+def setup_log(path):
+    """Write the perf logger to a rotating log file at path"""
+    handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                  encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(threadName)s %(levelname)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return handler
+
+def sql_label(sql):
+    """Collapse the whitespace of an SQL statement into a one-line label"""
+    label = WHITESPACE.sub(' ', sql).strip()
+    return label if len(label) <= MAX_LABEL else label[:MAX_LABEL - 3] + '...'
+
+def callable_label(fn):
+    """Name a function for statistics, e.g. 'refresh_expense_list.fetch_total'"""
+    fn = getattr(fn, 'func', fn)
+    name = getattr(fn, '__qualname__', repr(fn)).replace('.<locals>', '')
+    if '.' in name:
+        # Drop the class name of methods
+        name = name.split('.', 1)[1]
+    return name
+
+class PerfStats:
+    """Thread-safe timings grouped by kind ('sql', 'job', 'tk', ...) and label
+    
+    Each group keeps its count, total and longest time and the rows it
+    processed; the most recent records are kept individually as well.
+    """
+    
+    def __init__(self, recent=200):
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.recent = deque(maxlen=recent)
+    
+    def record(self, kind, label, seconds, rows=None):
+        """Add one timing; rows is the number of rows it returned or changed"""
+        with self.lock:
+            group = self.groups.get((kind, label))
+            if group is None:
+                group = self.groups[(kind, label)] = [0, 0.0, 0.0, 0]
+            group[0] += 1
+            group[1] += seconds
+            group[2] = max(group[2], seconds)
+            group[3] += rows or 0
+            self.recent.append((time.time(), kind, label, seconds, rows))
+        
+        ms = seconds * 1000
+        if ms >= SLOW_MS:
+            logger.warning("slow %s %.2f ms rows=%s: %s", kind, ms, rows, label)
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %.2f ms rows=%s: %s", kind, ms, rows, label)
+    
+    def timed(self, kind, label, started, rows=None):
+        """Record a timing that began at the perf_counter value started"""
+        self.record(kind, label, time.perf_counter() - started, rows)
+    
+    def call(self, kind, fn, *args):
+        """Call fn(*args), recording its time under kind and the name of fn"""
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.timed(kind, callable_label(fn), started)
+    
+    def snapshot(self):
+        """Return (kind, label, count, total, longest, rows) tuples, largest
+        total time first
+        """
+        with self.lock:
+            rows = [(kind, label, *group) for (kind, label), group in self.groups.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+    
+    def reset(self):
+        with self.lock:
+            self.groups.clear()
+            self.recent.clear()
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor recording each statement's time, including fetching its rows
+    
+    A statement is recorded once it is finished: when all its rows have been
+    fetched, the cursor runs another statement, or the cursor is closed or
+    discarded.
+    """
+    
+    statement = None
+    
+    def execute(self, sql, parameters=()):
+        self.finish_statement()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.start_statement(sql, started)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self.finish_statement()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.start_statement(sql, started)
+            self.finish_statement()
+    
+    def executescript(self, sql_script):
+        self.finish_statement()
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self.start_statement(sql_script, started)
+            self.finish_statement()
+    
+    def start_statement(self, sql, started):
+        # Changed rows for INSERT/UPDATE/DELETE; fetched rows are added later
+        rows = max(self.rowcount, 0)
+        self.statement = [sql, time.perf_counter() - started, rows]
+        if self.description is None:
+            self.finish_statement()
+    
+    def add_fetch(self, started, rows, done):
+        if self.statement is not None:
+            self.statement[1] += time.perf_counter() - started
+            self.statement[2] += rows
+            if done:
+                self.finish_statement()
+    
+    def finish_statement(self):
+        statement = self.statement
+        if statement is not None:
+            self.statement = None
+            self.connection.stats.record('sql', sql_label(statement[0]), statement[1], statement[2])
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.add_fetch(started, row is not None, row is None)
+        return row
+    
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.add_fetch(started, len(rows), not rows)
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.add_fetch(started, len(rows), True)
+        return rows
+    
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.add_fetch(started, 0, True)
+            raise
+        self.add_fetch(started, 1, False)
+        return row
+    
+    def close(self):
+        self.finish_statement()
+        super().close()
+    
+    def __del__(self):
+        self.finish_statement()
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors, including those behind execute and
+    executemany, record their statements in stats
+    """
+    
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats if stats is not None else PerfStats()
+    
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def profiled_connection(stats):
+    """Return a sqlite3 connection factory recording statements in stats"""
+    return functools.partial(ProfiledConnection, stats=stats)
+
+def trace_statement(statement):
+    """sqlite3 trace callback logging every statement as SQLite runs it,
+    with bound values filled in, including transaction control
+    """
+    logger.debug("trace: %s", statement)
+
+def profile_report(profiles, limit=PROFILE_REPORT_LINES):
+    """Combine cProfile.Profile objects (one per thread) into a text report
+    of the functions with the most cumulative time
+    """
+    out = io.StringIO()
+    stats = pstats.Stats(profiles[0], stream=out)
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return out.getvalue()
+
+def save_profile(profiles, path):
+    """Write the combined profiles to path in pstats format"""
+    stats = pstats.Stats(profiles[0])
+    for profile in profiles[1:]:
+        stats.add(profile)
+    stats.dump_stats(path)
+
+def start_profile():
+    """Start a cProfile.Profile for the calling thread and return it"""
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile